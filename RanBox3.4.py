@@ -4,10 +4,46 @@ from ttkbootstrap.constants import *
 import random
 import tkinter.font as tkfont
 from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 import sys
+import os
+import json
+import wave
+import queue
+import struct
+import base64
+import hashlib
+import zlib
+import re
+import asyncio
+import mmap
+import argparse
+import tempfile
+import threading
+import time
+import datetime
+import multiprocessing
+import gc
+import tracemalloc
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+# 可选依赖：跨平台音频播放，缺失时在 Windows 上退回 winsound
+try:
+    import simpleaudio
+except ImportError:
+    simpleaudio = None
+try:
+    import winsound
+except ImportError:
+    winsound = None
+# Pillow 随 wordcloud 一起安装，用于假名图集与字体查找
+try:
+    from PIL import Image, ImageDraw, ImageFont, ImageTk
+except ImportError:
+    Image = ImageDraw = ImageFont = ImageTk = None
 
 
 # 五十音图数据，按行划分
@@ -64,23 +100,1272 @@ for i in range(len(HIRAGANA)):
     sound = ROMAJI[i]
     SOUND_MAP[sound] = [HIRAGANA[i], KATAKANA[i], ROMAJI[i]]
 
+# 代码中直接写的中文字体名 -> 英文名，字体文件中没有记录中文名时使用
+FONT_ALIASES = {"微软雅黑": "Microsoft YaHei", "黑体": "SimHei"}
+# 字体名（字体文件 name 表中的各语言名称）-> 字体文件路径，首次查找字体时填充
+FONT_FILES = {}
+# name 表中的字体族名、完整名称与首选族名
+FONT_NAME_IDS = (1, 4, 16)
+# Macintosh 平台的编码 -> Python 编码
+MAC_ENCODINGS = {0: 'mac_roman', 1: 'shift_jis', 2: 'big5', 3: 'euc_kr', 25: 'gb2312'}
+# 粗体、斜体等字重/样式文件名，同一字体族中排在常规体之后索引
+FONT_STYLE_PATTERN = re.compile(r'bold|italic|oblique|light|thin|medium|black|heavy|semi|demi', re.I)
+
+
+def font_family_names(path):  # 读取字体文件 name 表中各平台、各语言的字体名
+    """
+    Tk 列出的是本地化的字体族名（如“ＭＳ 明朝”），Pillow 的 getname() 只给出英文名，
+    所以直接解析 name 表，把所有语言的名称都作为索引键。字体集合（.ttc）读取其中每个字体。
+    """
+    names = set()
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if header[:4] == b'ttcf':
+            count, = struct.unpack('>I', header[8:12])
+            offsets = struct.unpack(f'>{count}I', f.read(4 * count))
+        else:
+            offsets = (0,)
+        for offset in offsets:
+            f.seek(offset + 4)
+            num_tables, = struct.unpack('>H', f.read(2))
+            f.seek(offset + 12)
+            records = f.read(16 * num_tables)
+            for i in range(num_tables):
+                tag, _, table_offset, table_length = struct.unpack_from('>4sIII', records, 16 * i)
+                if tag != b'name':
+                    continue
+                f.seek(table_offset)
+                table = f.read(table_length)
+                _, record_count, string_offset = struct.unpack_from('>HHH', table)
+                for j in range(record_count):
+                    platform, encoding, _, name_id, length, name_offset = struct.unpack_from('>6H', table, 6 + 12 * j)
+                    if name_id not in FONT_NAME_IDS:
+                        continue
+                    data = table[string_offset + name_offset:string_offset + name_offset + length]
+                    codec = 'utf-16-be' if platform in (0, 3) else MAC_ENCODINGS.get(encoding)
+                    if codec is None:
+                        continue
+                    try:
+                        names.add(data.decode(codec).strip('\0 '))
+                    except UnicodeDecodeError:
+                        continue
+    names.discard('')
+    return names
+
+
+def scan_font_files():  # 扫描常见字体目录，建立字体名到文件路径的索引
+    # 定义常见字体目录
+    font_dirs = [
+        "C:\\Windows\\Fonts",  # Windows 字体目录
+        os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts"),  # Windows 当前用户安装的字体
+        os.path.expanduser("~/.fonts"),  # Linux 用户字体目录
+        "/usr/share/fonts",  # Linux 系统字体目录
+        "/usr/local/share/fonts"  # Linux 本地字体目录
+    ]
+    font_files = {}
+    for font_dir in font_dirs:
+        if os.path.exists(font_dir):
+            for dir_path, _, files in os.walk(font_dir):
+                # 常规体先索引，让字体族名指向常规体文件
+                for file in sorted(files, key=lambda name: bool(FONT_STYLE_PATTERN.search(name))):
+                    if file.lower().endswith(('.ttf', '.otf', '.ttc')):
+                        font_file_path = os.path.join(dir_path, file)
+                        try:
+                            families = font_family_names(font_file_path)
+                        except (OSError, struct.error):
+                            continue
+                        for family in families:
+                            font_files.setdefault(family, font_file_path)
+    return font_files
+
+
+# 任意书写形式 -> 罗马字，用于查找发音文件
+CHAR_TO_SOUND = {char: sound for sound, chars in SOUND_MAP.items() for char in chars}
+
+# 练习模式：“题目-答案”
+MODES = ["片-平", "平-片", "平-罗", "罗-平", "片-罗", "罗-片"]
+SCRIPTS = {"平": HIRAGANA, "片": KATAKANA, "罗": ROMAJI}
+SCRIPT_ROWS = {"平": HIRAGANA_ROWS, "片": KATAKANA_ROWS, "罗": ROMAJI_ROWS}
+
+
+def make_question(mode, index):  # 生成题目
+    """返回 (题目, 答案, 统计字符)，统计字符总是题目中的平/片假名"""
+    left, right = mode.split("-")
+    stat_script = left if left != "罗" else right
+    return SCRIPTS[left][index], SCRIPTS[right][index], SCRIPTS[stat_script][index]
+
+
+def find_target_char(mode, prompt):  # 根据题目查找统计字符
+    """找不到题目或模式未知时抛出 ValueError"""
+    if mode not in MODES:
+        raise ValueError(f"未知模式: {mode}")
+    left, _ = mode.split("-")
+    return make_question(mode, SCRIPTS[left].index(prompt))[2]
+
+
+def answer_rows(mode):  # 获取答案键盘的字符行
+    return SCRIPT_ROWS[mode.split("-")[1]]
+
+
+def shuffle_rows(rows, rng=random, derange=False):  # 打乱键盘布局，空位保持不变
+    """derange 为 True 时重新抽样，直到没有任何按键留在原位"""
+    home = [char for row in rows for char in row if char != " "]
+    char_list = list(home)
+    rng.shuffle(char_list)
+    while derange and any(a == b for a, b in zip(char_list, home)):
+        rng.shuffle(char_list)
+    chars = iter(char_list)
+    return [[next(chars) if char != " " else " " for char in row] for row in rows]
+
+
+def record_answer(correct_counts, target_char, is_correct, is_triple_mode=False):  # 更新正确率统计
+    increment = 3 if is_triple_mode else 1
+    stats = correct_counts.setdefault(target_char, {'correct': 0, 'total': 0})
+    stats['total'] += increment
+    if is_correct:
+        stats['correct'] += increment
+
+
+def proficiency_percentage(stats):  # 计算正确率
+    return (stats['correct'] / stats['total'] * 100) if stats['total'] > 0 else 0
+
+
+def weakest_chars(correct_counts, n=10):  # 获取熟练度最低且统计次数大于 1 次的前 n 个字符
+    proficiency_scores = []
+    for _, chars in SOUND_MAP.items():
+        for char in chars:
+            stats = correct_counts.get(char)
+            if stats and stats['total'] > 1:  # 统计次数大于 1 次
+                proficiency_scores.append((char, stats['correct'] / stats['total']))
+    proficiency_scores.sort(key=lambda x: x[1])
+    return [char for char, _ in proficiency_scores[:n]]
+
+
+def pick_random_mode(rng, selector=None):  # 随机模式：返回 (模式, 指定的下一题假名序号或 None)
+    if selector is not None:
+        return selector.sample()
+    return rng.choice(MODES), None
+
+
+def build_match_board(top_chars, rng=random):  # 生成连连看字符列表
+    char_list = []
+    for char in top_chars:
+        # 添加平假名、片假名、罗马字以及其中任意一个符号
+        chars = SOUND_MAP[CHAR_TO_SOUND[char]]
+        char_list.extend(chars)
+        char_list.append(rng.choice(chars))
+
+    # 确保每个字符出现偶数次
+    char_list *= 2
+    rng.shuffle(char_list)
+    return char_list
+
+
+class QuizPrefetcher:  # 题目、乱序键盘与连连看预取
+    """
+    在空闲时预先生成接下来的若干题目序号、每种书写形式的乱序键盘和下一张连连看，
+    放在有界缓冲中，出题时只需取出现成的结果。
+    题目、各书写形式的键盘和连连看各用一个由种子派生的独立随机流，
+    取到的结果与预取时机无关，同一种子下录制与重放仍然一致。
+    """
+
+    LAYOUT_DEPTH = 2  # 每种书写形式预取的乱序键盘数
+
+    def __init__(self, seed=None, depth=8, derange=False):
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 63)
+        self.depth = max(depth, 1)
+        self.derange = derange
+        self.index_rng = random.Random(f"{seed}-index")
+        self.layout_rngs = {script: random.Random(f"{seed}-layout-{script}") for script in SCRIPT_ROWS}
+        self.board_rng = random.Random(f"{seed}-board")
+        self.indices = deque()
+        self.layouts = {script: deque() for script in SCRIPT_ROWS}
+        self.board = None  # (随机种子, 字符, 连连看字符列表)
+
+    def fill_indices(self):
+        while len(self.indices) < self.depth:
+            self.indices.append(self.index_rng.randint(0, len(HIRAGANA) - 1))
+
+    def fill_layout(self, script):
+        while len(self.layouts[script]) < self.LAYOUT_DEPTH:
+            self.layouts[script].append(
+                shuffle_rows(SCRIPT_ROWS[script], self.layout_rngs[script], self.derange))
+
+    def fill_board(self, top_chars):
+        if self.board is None:
+            board_seed = self.board_rng.getrandbits(64)
+        else:
+            board_seed, chars, _ = self.board
+            if chars == top_chars:
+                return
+        self.board = (board_seed, list(top_chars), build_match_board(top_chars, random.Random(board_seed)))
+
+    def fill(self, top_chars=None):  # 空闲时补满缓冲
+        self.fill_indices()
+        for script in SCRIPT_ROWS:
+            self.fill_layout(script)
+        if top_chars is not None:
+            self.fill_board(top_chars)
+
+    def next_index(self):  # 下一题的假名序号
+        if not self.indices:
+            self.fill_indices()
+        return self.indices.popleft()
+
+    def next_layout(self, script):  # 下一个乱序键盘
+        if not self.layouts[script]:
+            self.fill_layout(script)
+        return self.layouts[script].popleft()
+
+    def next_board(self, top_chars):  # 下一张连连看；最弱的字符变了时用同一个种子重新生成
+        self.fill_board(top_chars)
+        _, _, board = self.board
+        self.board = None
+        return board
+
+
+class AdaptiveModeSelector:  # 自适应模式选择
+    """
+    Thompson 采样选择下一题的模式。
+    每个臂（模式，或 (模式, 假名序号)）维护一个 Beta(答错+1, 答对+1) 后验，
+    一次性对所有臂采样答错概率并取最大者，练习时间会集中到总是答错的组合上。
+    """
+
+    def __init__(self, granularity="mode", rng=None):
+        self.granularity = granularity
+        if granularity == "mode":
+            self.arms = list(MODES)
+        else:  # "kana"：(模式, 假名序号)
+            self.arms = [(mode, index) for mode in MODES for index in range(len(HIRAGANA))]
+        self.arm_index = {arm: i for i, arm in enumerate(self.arms)}
+        self.failures = np.ones(len(self.arms))
+        self.successes = np.ones(len(self.arms))
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def arm(self, mode, index):
+        return mode if self.granularity == "mode" else (mode, index)
+
+    def load(self, mode_counts):  # 从已保存的 (模式, 统计字符) 结果重建后验
+        self.failures[:] = 1
+        self.successes[:] = 1
+        for mode in MODES:
+            for index in range(len(HIRAGANA)):
+                stats = mode_counts.get((mode, make_question(mode, index)[2]))
+                if stats:
+                    i = self.arm_index[self.arm(mode, index)]
+                    self.successes[i] += stats['correct']
+                    self.failures[i] += stats['total'] - stats['correct']
+
+    def update(self, mode, index, is_correct):
+        i = self.arm_index[self.arm(mode, index)]
+        if is_correct:
+            self.successes[i] += 1
+        else:
+            self.failures[i] += 1
+
+    def sample(self):  # 返回 (模式, 假名序号)，按模式粒度时假名序号为 None
+        arm = self.arms[int(np.argmax(self.rng.beta(self.failures, self.successes)))]
+        return (arm, None) if self.granularity == "mode" else arm
+
+
+def resample_strokes(strokes, n=32):  # 笔迹重采样
+    """
+    把按书写顺序连接起来的笔画沿笔迹长度等距重采样为 n 个点（抬笔移动的距离不计入），
+    并平移到重心、按最大边长缩放，返回 (n, 2) 数组。
+    """
+    points = np.array([point for stroke in strokes for point in stroke], dtype=float)
+    if len(points) == 0:
+        return np.zeros((n, 2))
+    if len(points) == 1:
+        points = np.repeat(points, 2, axis=0)
+    steps = np.hypot(*np.diff(points, axis=0).T)
+    # 上一笔末点到下一笔起点是抬笔移动，不算作笔迹
+    steps[np.cumsum([len(stroke) for stroke in strokes if stroke])[:-1] - 1] = 0
+    distances = np.concatenate([[0], np.cumsum(steps)])
+    targets = np.linspace(0, distances[-1], n)
+    resampled = np.column_stack([np.interp(targets, distances, points[:, 0]),
+                                 np.interp(targets, distances, points[:, 1])])
+    resampled -= resampled.mean(axis=0)
+    scale = np.ptp(resampled, axis=0).max()
+    return resampled / scale if scale > 0 else resampled
+
+
+def stroke_features(strokes, n=32):  # 识别用的特征：重采样后的坐标与加权的运笔方向，返回 (n, 4) 数组
+    """只比较坐标时一条直线和笔画弯折不大的字（如く、へ）距离很近，加入运笔方向后弯折处才会拉开距离"""
+    points = resample_strokes(strokes, n)
+    directions = np.gradient(points, axis=0)
+    lengths = np.hypot(*directions.T)[:, None]
+    directions = np.divide(directions, lengths, out=np.zeros_like(directions), where=lengths > 0)
+    return np.hstack([points, HANDWRITING_DIRECTION_WEIGHT * directions])
+
+
+def count_strokes(strokes):  # 笔画数，不计没有点的空笔画
+    return sum(1 for stroke in strokes if stroke)
+
+
+# 内置笔迹模板由 KanjiVG 的笔顺数据生成，随程序一起分发
+STROKE_TEMPLATE_FILE = "kana_stroke_templates.json"
+STROKE_TEMPLATE_SOURCE = ("KanjiVG (https://kanjivg.tagaini.net), copyright Ulrich Apel, "
+                          "CC BY-SA 3.0 (https://creativecommons.org/licenses/by-sa/3.0/)")
+# DTW 距离超过该值时不认为写的是这个字符（坐标已按最大边长缩放到 1）
+HANDWRITING_MAX_DISTANCE = 5.0
+# 运笔方向（单位向量）相对坐标的权重
+HANDWRITING_DIRECTION_WEIGHT = 0.3
+# 笔画数与模板相差超过该值的不参与比较；每差一画在距离上加罚分
+HANDWRITING_STROKE_TOLERANCE = 1
+HANDWRITING_STROKE_PENALTY = 1.5
+
+
+def svg_path_points(d, samples=4):  # 把 SVG 路径（M/L/C/S，大小写均可）采样为点列表
+    tokens = re.findall(r"[MmLlCcSsZz]|-?(?:\d+\.?\d*|\.\d+)(?:e-?\d+)?", d)
+    points = []
+    x = y = 0.0
+    control = None  # 上一段三次贝塞尔的第二个控制点，供 S 命令反射
+    command = None
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in "Zz":
+                continue
+        relative = command.islower()
+        op = command.upper()
+        count = {"M": 2, "L": 2, "C": 6, "S": 4}[op]
+        values = [float(v) for v in tokens[i:i + count]]
+        i += count
+        if relative:
+            values = [v + (x if k % 2 == 0 else y) for k, v in enumerate(values)]
+        if op == "M":
+            x, y = values
+            points.append((x, y))
+            command = "l" if relative else "L"  # M 之后的坐标对按直线处理
+            control = None
+            continue
+        if op == "L":
+            x, y = values
+            points.append((x, y))
+            control = None
+            continue
+        if op == "S":
+            c1 = (2 * x - control[0], 2 * y - control[1]) if control is not None else (x, y)
+            values = [*c1, *values]
+        p0 = np.array([x, y])
+        c1, c2, p3 = np.array(values[0:2]), np.array(values[2:4]), np.array(values[4:6])
+        t = np.linspace(0, 1, samples + 1)[1:, None]
+        curve = ((1 - t) ** 3 * p0 + 3 * (1 - t) ** 2 * t * c1 + 3 * (1 - t) * t ** 2 * c2 + t ** 3 * p3)
+        points.extend(map(tuple, curve))
+        control = tuple(c2)
+        x, y = p3
+    return points
+
+
+def build_stroke_templates(kanjivg_dir, output_file):  # 从 KanjiVG 的笔顺 SVG 生成内置假名笔迹模板
+    """kanjivg_dir 为 KanjiVG 的 kanji 目录，文件名为五位十六进制码位，如 03042.svg"""
+    templates = {}
+    for char in HIRAGANA + KATAKANA:
+        path = os.path.join(kanjivg_dir, f"{ord(char):05x}.svg")
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            paths = re.findall(r'<path[^>]*\sd="([^"]+)"', f.read())
+        templates[char] = [[[[round(x, 1), round(y, 1)] for x, y in svg_path_points(d)] for d in paths]]
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({'source': STROKE_TEMPLATE_SOURCE, 'templates': templates}, f, ensure_ascii=False,
+                  separators=(',', ':'))
+    return len(templates)
+
+
+class StrokeRecognizer:  # 手写假名识别
+    """
+    模板库为 JSON 文件 {字符: [笔迹, ...]}，每个笔迹是若干笔画，每个笔画是 [x, y] 点列表。
+    内置模板覆盖全部平/片假名，学习者录入的模板另存一个文件，两者一起参与识别。
+    所有模板预先重采样为 (模板数, n, 2) 数组，识别时对全部候选模板一次性做
+    带 Sakoe-Chiba 窗口的 DTW，循环只在 n 个点上进行，模板维度完全向量化。
+    笔画数与模板相差太多的直接排除，相差一画的加罚分；
+    距离超过 max_distance 的候选不返回，乱写不会被当成任何字符。
+    """
+
+    def __init__(self, library_file, builtin_file=None, n=32, window=4, max_distance=HANDWRITING_MAX_DISTANCE):
+        self.library_file = library_file
+        self.n = n
+        self.window = window
+        self.max_distance = max_distance
+        self.builtin = self.load(builtin_file).get('templates', {}) if builtin_file else {}
+        self.library = self.load(library_file)  # 字符 -> 学习者录入的原始笔迹列表
+        self.templates = np.zeros((0, n, 4))
+        self.labels = np.array([], dtype=object)
+        self.stroke_counts = np.array([], dtype=int)
+        self.rebuild()
+
+    @staticmethod
+    def load(path):  # 读取模板文件，不存在或损坏时为空
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"加载笔迹模板时出错: {e}")
+            return {}
+
+    def rebuild(self):  # 重新生成模板数组
+        samples = [(char, strokes) for library in (self.builtin, self.library)
+                   for char, variants in library.items() for strokes in variants]
+        self.labels = np.array([char for char, _ in samples], dtype=object)
+        self.stroke_counts = np.array([count_strokes(strokes) for _, strokes in samples], dtype=int)
+        self.templates = np.array([stroke_features(strokes, self.n) for _, strokes in samples]).reshape(-1, self.n, 4)
+
+    def add_template(self, char, strokes):  # 录入一个新模板并保存到文件
+        self.library.setdefault(char, []).append(strokes)
+        self.rebuild()
+        try:
+            with open(self.library_file, 'w', encoding='utf-8') as f:
+                json.dump(self.library, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"保存笔迹模板时出错: {e}")
+
+    def recognize(self, strokes, candidates=None, k=3):  # 返回最相近的 k 个 (字符, 距离)
+        stroke_difference = np.abs(self.stroke_counts - count_strokes(strokes))
+        mask = stroke_difference <= HANDWRITING_STROKE_TOLERANCE
+        if candidates is not None:
+            mask &= np.isin(self.labels, list(candidates))
+        if not mask.any():
+            return []
+        templates = self.templates[mask]
+        labels = self.labels[mask]
+        query = stroke_features(strokes, self.n)
+
+        # cost[m, i, j]：查询第 i 点与第 m 个模板第 j 点的距离
+        cost = np.linalg.norm(query[None, :, None, :] - templates[:, None, :, :], axis=3)
+        acc = np.full((len(templates), self.n + 1, self.n + 1), np.inf)
+        acc[:, 0, 0] = 0
+        for i in range(1, self.n + 1):
+            for j in range(max(1, i - self.window), min(self.n, i + self.window) + 1):
+                acc[:, i, j] = cost[:, i - 1, j - 1] + np.minimum(
+                    np.minimum(acc[:, i - 1, j], acc[:, i, j - 1]), acc[:, i - 1, j - 1])
+        distances = acc[:, self.n, self.n] + stroke_difference[mask] * HANDWRITING_STROKE_PENALTY
+
+        # 同一字符的多个模板只保留最近的一个，超过距离上限的不算
+        results = {}
+        for index in np.argsort(distances):
+            if distances[index] > self.max_distance:
+                break
+            char = labels[index]
+            if char not in results:
+                results[char] = float(distances[index])
+                if len(results) == k:
+                    break
+        return list(results.items())
+
+
+# 单词索引：平假名占第 0-45 位，片假名占第 46-91 位，用两个 uint64 存储
+KANA_BITS = {char: i for i, char in enumerate(HIRAGANA + KATAKANA)}
+WORD_INDEX_MAGIC = b"KANAWRD1"
+WORD_INDEX_HEADER = struct.Struct("<8sQ")  # 魔数, 词条数
+# 达到以下次数与正确率才算掌握
+MASTERED_MIN_TOTAL = 5
+MASTERED_PERCENTAGE = 80
+# 单词表 words.txt 首次使用时编译为内存映射索引 words.idx
+WORD_SOURCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "words.txt")
+WORD_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "words.idx")
+
+
+def kana_mask(chars):  # 字符集合对应的位掩码
+    mask = 0
+    for char in chars:
+        mask |= 1 << KANA_BITS[char]
+    return mask
+
+
+def romanize(word):  # 只由基本假名组成的单词转为罗马字
+    return "".join(CHAR_TO_SOUND[char] for char in word)
+
+
+def compile_word_index(source_file, index_file):  # 把单词表编译为二进制索引
+    """
+    单词表每行为“单词<TAB>释义”（释义可省略），只保留全部由五十音基本假名组成的单词。
+    索引布局：文件头 | 每词 2 个 uint64 的假名位掩码 | (词条数+1) 个 uint64 偏移 | UTF-8 词条数据
+    """
+    masks = []
+    offsets = [0]
+    blob = bytearray()
+    with open(source_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            word, _, gloss = line.rstrip('\n').partition('\t')
+            word = word.strip()
+            if not word or any(char not in KANA_BITS for char in word):
+                continue
+            mask = kana_mask(word)
+            masks.append((mask & 0xFFFFFFFFFFFFFFFF, mask >> 64))
+            blob += f"{word}\t{gloss.strip()}".encode('utf-8')
+            offsets.append(len(blob))
+
+    with open(index_file, 'wb') as f:
+        f.write(WORD_INDEX_HEADER.pack(WORD_INDEX_MAGIC, len(masks)))
+        f.write(np.array(masks, dtype=np.uint64).reshape(-1, 2).tobytes())
+        f.write(np.array(offsets, dtype=np.uint64).tobytes())
+        f.write(bytes(blob))
+    return len(masks)
+
+
+class WordIndex:  # 内存映射的单词索引
+    """打开时只映射文件、不解析词条；按掩码筛选只读取掩码列，词条在选中时才解码"""
+
+    def __init__(self, index_file):
+        self.file = open(index_file, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = WORD_INDEX_HEADER.unpack_from(self.data)
+        if magic != WORD_INDEX_MAGIC:
+            raise ValueError(f"不是单词索引文件: {index_file}")
+        masks_start = WORD_INDEX_HEADER.size
+        offsets_start = masks_start + self.count * 16
+        self.blob_start = offsets_start + (self.count + 1) * 8
+        self.masks = np.frombuffer(self.data, dtype=np.uint64, count=self.count * 2,
+                                   offset=masks_start).reshape(-1, 2)
+        self.offsets = np.frombuffer(self.data, dtype=np.uint64, count=self.count + 1, offset=offsets_start)
+
+    @classmethod
+    def open(cls, source_file, index_file):  # 索引不存在或比单词表旧时重新编译
+        if os.path.exists(source_file) and (not os.path.exists(index_file)
+                                            or os.path.getmtime(index_file) < os.path.getmtime(source_file)):
+            count = compile_word_index(source_file, index_file)
+            print(f"单词索引已编译: {count} 个词条")
+        if not os.path.exists(index_file):
+            return None
+        return cls(index_file)
+
+    def words_within(self, allowed_mask):  # 只使用允许假名的词条序号
+        lo = np.uint64(allowed_mask & 0xFFFFFFFFFFFFFFFF)
+        hi = np.uint64(allowed_mask >> 64)
+        return np.flatnonzero(((self.masks[:, 0] & ~lo) == 0) & ((self.masks[:, 1] & ~hi) == 0))
+
+    def entry(self, i):  # 返回 (单词, 释义)
+        start = self.blob_start + int(self.offsets[i])
+        end = self.blob_start + int(self.offsets[i + 1])
+        word, _, gloss = self.data[start:end].decode('utf-8').partition('\t')
+        return word, gloss
+
+    def close(self):
+        # 先释放 NumPy 视图，否则 mmap 无法关闭
+        self.masks = self.offsets = None
+        self.data.close()
+        self.file.close()
+
+
+def mastered_mask(correct_counts):  # 已掌握假名的位掩码
+    mastered = []
+    for char in KANA_BITS:
+        stats = correct_counts.get(char)
+        if stats and stats['total'] >= MASTERED_MIN_TOTAL and proficiency_percentage(stats) >= MASTERED_PERCENTAGE:
+            mastered.append(char)
+    return kana_mask(mastered)
+
+
+def make_word_question(word_index, correct_counts, rng):  # 单词题：(单词, 释义, 答案, 选项)，没有可出的单词时为 None
+    """只从全部由已掌握假名组成的单词中选；随机数只用 rng，界面与无界面重放出题相同"""
+    candidates = word_index.words_within(mastered_mask(correct_counts))
+    if len(candidates) == 0:
+        return None
+    # 第一个是题目，其余作为干扰项
+    picks = rng.sample(range(len(candidates)), min(4, len(candidates)))
+    entries = [word_index.entry(int(candidates[i])) for i in picks]
+    word, gloss = entries[0]
+    choices = list(dict.fromkeys(romanize(entry_word) for entry_word, _ in entries))
+    rng.shuffle(choices)
+    return word, gloss, romanize(word), choices
+
+
+# 原始答题记录保留天数，更早的记录只保留在日/周汇总表中
+RAW_HISTORY_DAYS = 30
+
+
+def period_keys(timestamp):  # 时间戳所在的日期与所在周的周一
+    day = datetime.date.fromtimestamp(timestamp)
+    return day.isoformat(), (day - datetime.timedelta(days=day.weekday())).isoformat()
+
+
+class ProgressChart:  # 进度曲线
+    """
+    从日/周汇总表绘制正确率与练习量，不扫描原始答题记录。
+    曲线设为 animated，新答题时只恢复缓存的背景、重画曲线并 blit，
+    只有出现新的日期/周或切换筛选条件时才整体重绘。
+    """
+
+    PERIODS = {"日": ("daily_rollup", "day", 365), "周": ("weekly_rollup", "week", 7 * 104)}
+
+    def __init__(self, master, conn, bg_color):
+        # matplotlib 只在打开曲线窗口时才导入
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.conn = conn
+        self.period = "日"
+        self.char = None  # None 表示全部假名
+        self.figure = Figure(figsize=(8, 4), dpi=100, facecolor=bg_color)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_ylim(0, 100)
+        self.ax.set_ylabel("正确率 %")
+        self.ax_count = self.ax.twinx()
+        self.ax_count.set_ylabel("答题数")
+        self.accuracy_line, = self.ax.plot([], [], color="green", marker=".", animated=True)
+        self.count_line, = self.ax_count.plot([], [], color="gray", alpha=0.6, animated=True)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.background = None
+        self.dates = []
+
+    def query(self):  # 按日/周汇总正确率与答题数
+        table, column, days = self.PERIODS[self.period]
+        since = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+        sql = f"SELECT {column}, SUM(correct), SUM(total) FROM {table} WHERE {column} >= ?"
+        params = [since]
+        if self.char is not None:
+            sql += " AND char = ?"
+            params.append(self.char)
+        rows = self.conn.execute(sql + f" GROUP BY {column} ORDER BY {column}", params).fetchall()
+        dates = [datetime.date.fromisoformat(period) for period, _, _ in rows]
+        accuracy = [correct / total * 100 if total else 0 for _, correct, total in rows]
+        counts = [total for _, _, total in rows]
+        return dates, accuracy, counts
+
+    def reload(self):  # 整体重绘
+        self.dates, accuracy, counts = self.query()
+        self.accuracy_line.set_data(self.dates, accuracy)
+        self.count_line.set_data(self.dates, counts)
+        if self.dates:
+            self.ax.set_xlim(self.dates[0] - datetime.timedelta(days=1),
+                             self.dates[-1] + datetime.timedelta(days=1))
+            self.ax_count.set_ylim(0, max(counts) * 1.2)
+        self.canvas.draw()
+
+    def on_draw(self, event):  # 整体重绘后缓存背景并画上曲线
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        self.ax.draw_artist(self.accuracy_line)
+        self.ax_count.draw_artist(self.count_line)
+
+    def update(self):  # 新答题后刷新
+        dates, accuracy, counts = self.query()
+        if self.background is None or dates != self.dates or max(counts, default=0) > self.ax_count.get_ylim()[1]:
+            self.reload()
+            return
+        # 坐标轴不变，只有最后一个数据点变化，恢复背景后局部重绘
+        self.accuracy_line.set_data(dates, accuracy)
+        self.count_line.set_data(dates, counts)
+        self.canvas.restore_region(self.background)
+        self.draw_lines()
+        self.canvas.blit(self.figure.bbox)
+
+    def close(self):
+        self.figure.clear()
+        self.canvas.get_tk_widget().destroy()
+
+
+class IntensiveTrainingView:  # 加强训练窗口
+    """
+    窗口、Figure 与画布只创建一次：关闭时隐藏窗口并销毁连连看按钮，
+    再次打开时只替换词云图像的数据并重建按钮，程序退出时 close() 释放全部资源。
+    """
+
+    def __init__(self, app):
+        # matplotlib 只在第一次打开加强训练时才导入
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.app = app
+        self.window = ttk.Toplevel(app.root)
+        self.window.title("加强训练")
+        self.window.geometry("1400x800")
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+
+        # 配置窗口的行列权重，使用 grid 布局
+        self.window.columnconfigure(0, weight=2)
+        self.window.rowconfigure(0, weight=2)
+        self.window.rowconfigure(1, weight=6)
+
+        self.figure = Figure(figsize=(6, 2), dpi=100)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.axis("off")
+        self.image = None  # 词云图像，再次打开时只替换数据
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.window)
+        self.canvas.get_tk_widget().grid(row=0, column=0, sticky="ew")
+
+        self.game_frame = ttk.Frame(self.window)
+        self.game_frame.grid(row=1, column=0, sticky="nsew")
+        self.board_shape = (0, 0)
+        self.selected = []  # 已选中的 (按钮, 字符)
+        self.original_bg = self.window.cget("background")
+        self.flash_id = None
+
+        # 连连看按钮样式只配置一次，字体使用描述元组，不再每次创建 tkfont.Font
+        app.style.configure("CustomMSYH.TButton", font=("微软雅黑", 12))
+
+    def show(self, top_chars, char_list, font_path):  # 显示词云与连连看
+        app = self.app
+        bg_color = app.style.lookup("TFrame", "background") if app.dark_mode else "white"
+
+        # 生成词云，只保留图像数组
+        wordcloud_dict = {char: 1 / (i + 1) for i, char in enumerate(top_chars)}
+        wc = WordCloud(font_path=font_path, background_color=bg_color, prefer_horizontal=1)
+        image = wc.generate_from_frequencies(wordcloud_dict).to_array()
+        if self.image is None:
+            self.image = self.ax.imshow(image, interpolation='bilinear')
+        else:
+            self.image.set_data(image)
+
+        # 设置图形与画布的背景颜色
+        self.figure.set_facecolor(bg_color)
+        self.canvas.get_tk_widget().config(
+            background=app.style.lookup("TFrame", "background") if app.dark_mode else "#f5f5f5")
+        self.canvas.draw()
+
+        self.build_board(char_list)
+        self.window.deiconify()
+        self.window.lift()
+
+    def build_board(self, char_list):  # 生成连连看游戏布局
+        self.clear_board()
+
+        # 计算合适的行数和列数
+        n = len(char_list)
+        rows = int(np.sqrt(n))
+        while n % rows != 0:
+            rows -= 1
+        cols = n // rows
+        board = np.array(char_list).reshape(rows, cols)
+
+        # 上一次的行列权重可能更多，先清除
+        for i in range(self.board_shape[0]):
+            self.game_frame.rowconfigure(i, weight=0)
+        for j in range(self.board_shape[1]):
+            self.game_frame.columnconfigure(j, weight=0)
+        self.board_shape = (rows, cols)
+
+        for i in range(rows):
+            self.game_frame.rowconfigure(i, weight=1)
+            for j in range(cols):
+                self.game_frame.columnconfigure(j, weight=1)
+                char = board[i][j]
+                btn = ttk.Button(
+                    self.game_frame,
+                    text=char,
+                    style="CustomMSYH.TButton",
+                    **self.app.glyph_options(char, font="微软雅黑")
+                )
+                btn.config(command=lambda b=btn, c=char: self.on_button_click(b, c))
+                btn.grid(row=i, column=j, padx=5, pady=5, sticky="nsew")
+
+    def on_button_click(self, btn, char):
+        # 禁止自己连自己
+        if self.selected and btn == self.selected[0][0]:
+            return
+        self.selected.append((btn, char))
+        btn.config(bootstyle="info")
+        if len(self.selected) < 2:
+            return
+        (first, first_char), (second, second_char) = self.selected
+        self.selected = []
+        if any(first_char in chars and second_char in chars for chars in SOUND_MAP.values()):
+            # 匹配成功，窗口变绿一秒
+            first.destroy()
+            second.destroy()
+            self.flash("green")
+        else:
+            # 匹配失败，窗口变红一秒
+            self.flash("red")
+            first.config(bootstyle="Custom.TButton")
+            second.config(bootstyle="Custom.TButton")
+
+    def flash(self, color):  # 窗口变色一秒
+        if self.flash_id is not None:
+            self.window.after_cancel(self.flash_id)
+        self.window.configure(background=color)
+        self.flash_id = self.window.after(1000, self.reset_background)
+
+    def reset_background(self):
+        self.flash_id = None
+        self.window.configure(background=self.original_bg)
+
+    def clear_board(self):
+        self.selected = []
+        for child in self.game_frame.winfo_children():
+            child.destroy()
+
+    def hide(self):  # 关闭窗口：隐藏并销毁按钮，图形留待下次复用
+        if self.flash_id is not None:
+            self.window.after_cancel(self.flash_id)
+            self.reset_background()
+        self.clear_board()
+        self.window.withdraw()
+
+    def close(self):  # 释放图形与窗口
+        self.hide()
+        self.figure.clear()
+        self.canvas.get_tk_widget().destroy()
+        self.window.destroy()
+
+
+def memory_usage():  # 返回 (tracemalloc 统计的 Python 分配字节数, 进程 RSS 字节数)，无法读取 RSS 时为 None
+    traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        rss = None
+    return traced, rss
+
+
+class GlyphAtlas:  # 假名图集
+    """
+    每种 (字体文件, 像素字号, 主题) 组合把全部假名栅格化一次并缓存为 PhotoImage，
+    键盘、连连看与熟练度地图直接贴图，不再逐个控件解析字体、测量文字。
+    最多保留 max_sets 组，内存只与假名表大小成正比。
+    """
+
+    THEME_COLORS = {"light": (0, 0, 0, 255), "dark": (255, 255, 255, 255)}
+
+    def __init__(self, master, max_sets=8):
+        self.master = master
+        self.max_sets = max_sets
+        self.sets = OrderedDict()  # (字体文件, 像素字号, 主题) -> {字符: PhotoImage}
+
+    def glyph_set(self, font_path, size, theme):
+        key = (font_path, size, theme)
+        if key in self.sets:
+            self.sets.move_to_end(key)
+            return self.sets[key]
+        font = ImageFont.truetype(font_path, size)
+        glyphs = {}
+        for char in HIRAGANA + KATAKANA + ROMAJI:
+            left, top, right, bottom = font.getbbox(char)
+            image = Image.new("RGBA", (right - left + 2, bottom - top + 2), (0, 0, 0, 0))
+            ImageDraw.Draw(image).text((1 - left, 1 - top), char, font=font, fill=self.THEME_COLORS[theme])
+            glyphs[char] = ImageTk.PhotoImage(image, master=self.master)
+        self.sets[key] = glyphs
+        while len(self.sets) > self.max_sets:
+            self.sets.popitem(last=False)
+        return glyphs
+
+    def get(self, font_path, size, theme, char):
+        return self.glyph_set(font_path, size, theme).get(char)
+
+
+class PronunciationPlayer:  # 发音播放器
+    """
+    从本地音频包播放发音。
+    音频文件为 <asset_dir>/<罗马字>.wav，解码一次后放入内存 LRU 缓存，
+    播放在独立线程中进行，不阻塞 Tk 事件循环。
+    """
+
+    def __init__(self, asset_dir, cache_size=64):
+        self.asset_dir = asset_dir
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # 罗马字 -> 解码后的音频
+        self.cache_lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.current_play = None
+        self.available = os.path.isdir(asset_dir) and (simpleaudio is not None or winsound is not None)
+
+        self.worker = threading.Thread(target=self._run, name="pronunciation", daemon=True)
+        self.worker.start()
+        if self.available:
+            # 后台预加载整个音频包，首次播放无需读盘
+            threading.Thread(target=self.preload, name="pronunciation-preload", daemon=True).start()
+
+    def preload(self):  # 预加载全部发音
+        for sound in list(SOUND_MAP)[:self.cache_size]:
+            self._get_clip(sound)
+
+    def _load_clip(self, sound):  # 读取并解码 wav 文件
+        path = os.path.join(self.asset_dir, f"{sound}.wav")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                wav_bytes = f.read()
+            with wave.open(path, 'rb') as w:
+                frames = w.readframes(w.getnframes())
+                clip = (wav_bytes, frames, w.getnchannels(), w.getsampwidth(), w.getframerate())
+        except (wave.Error, OSError) as e:
+            print(f"读取发音文件出错: {path}: {e}")
+            return None
+        return clip
+
+    def _get_clip(self, sound):  # 从缓存中取音频，未命中时解码并淘汰最久未用的条目
+        with self.cache_lock:
+            if sound in self.cache:
+                self.cache.move_to_end(sound)
+                return self.cache[sound]
+        clip = self._load_clip(sound)
+        if clip is None:
+            return None
+        with self.cache_lock:
+            self.cache[sound] = clip
+            self.cache.move_to_end(sound)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return clip
+
+    def play(self, char):  # 请求播放，立即返回
+        if not self.available:
+            return
+        sound = CHAR_TO_SOUND.get(char)
+        if sound is not None:
+            self.requests.put(sound)
+
+    def _run(self):  # 播放线程
+        while True:
+            sound = self.requests.get()
+            if sound is None:
+                break
+            # 只播放最新的请求，丢弃积压的旧请求
+            while not self.requests.empty():
+                sound = self.requests.get_nowait()
+                if sound is None:
+                    return
+            clip = self._get_clip(sound)
+            if clip is None:
+                continue
+            try:
+                self._play_clip(clip)
+            except Exception as e:
+                print(f"播放发音时出错: {e}")
+
+    def _play_clip(self, clip):
+        wav_bytes, frames, channels, sampwidth, framerate = clip
+        if simpleaudio is not None:
+            if self.current_play is not None:
+                self.current_play.stop()
+            self.current_play = simpleaudio.play_buffer(frames, channels, sampwidth, framerate)
+        else:
+            # winsound 不支持异步播放内存数据，在播放线程中同步播放
+            winsound.PlaySound(wav_bytes, winsound.SND_MEMORY | winsound.SND_NODEFAULT)
+
+    def close(self):  # 停止播放线程
+        self.requests.put(None)
+        if self.current_play is not None:
+            self.current_play.stop()
+
+
+# 连胜排行榜：每个 (模式, 周期, 周期键) 保留前 LEADERBOARD_SIZE 名，每人只保留最好成绩
+LEADERBOARD_SIZE = 10
+ALL_MODES = "全部"
+MIXED_MODE = "混合"  # 连胜途中换过模式，只计入“全部”榜
+WORD_DRILL_MODE = "单词"
+LEADERBOARD_MODES = [ALL_MODES] + MODES + [WORD_DRILL_MODE]
+LEADERBOARD_PERIODS = {"day": "今日", "week": "本周", "all": "总榜"}
+STREAK_HISTORY = 20  # 服务器为每个学习者在内存中保留的最近连胜记录数
+
+
+def create_streak_tables(conn):  # 创建连胜记录与排行榜表
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS streak_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profile TEXT,
+            mode TEXT,
+            triple INTEGER,
+            length INTEGER,
+            started REAL,
+            ended REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_streak_records_profile ON streak_records (profile, ended)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            mode TEXT,
+            period TEXT,
+            period_key TEXT,
+            profile TEXT,
+            length INTEGER,
+            triple INTEGER,
+            achieved REAL,
+            PRIMARY KEY (mode, period, period_key, profile)
+        )
+    ''')
+    # 按名次读取一个榜单只需沿索引取前 k 行
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leaderboard_rank
+        ON leaderboard (mode, period, period_key, length DESC, achieved)
+    ''')
+    conn.commit()
+
+
+def leaderboard_keys(mode, day, week):  # 一次连胜计入的 (模式, 周期, 周期键)
+    modes = [ALL_MODES] if mode == MIXED_MODE else [mode, ALL_MODES]
+    return [(board_mode, period, key) for board_mode in modes
+            for period, key in (("day", day), ("week", week), ("all", ""))]
+
+
+def write_streaks(conn, records, board_rows, size=LEADERBOARD_SIZE):  # 写入连胜记录与排行榜变动
+    """records 为 (档案, 模式, 三倍, 长度, 开始, 结束)，board_rows 为 (模式, 周期, 周期键, 档案, 长度, 三倍, 时间)"""
+    conn.executemany('''
+        INSERT INTO streak_records (profile, mode, triple, length, started, ended) VALUES (?, ?, ?, ?, ?, ?)
+    ''', records)
+    conn.executemany('''
+        INSERT INTO leaderboard (mode, period, period_key, profile, length, triple, achieved)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (mode, period, period_key, profile) DO UPDATE SET
+            length = excluded.length, triple = excluded.triple, achieved = excluded.achieved
+        WHERE excluded.length > leaderboard.length
+    ''', board_rows)
+    # 挤出前 size 名的行从表中删除，每个榜单的行数保持不变
+    for key in {row[:3] for row in board_rows}:
+        conn.execute('''
+            DELETE FROM leaderboard WHERE rowid IN (
+                SELECT rowid FROM leaderboard WHERE mode = ? AND period = ? AND period_key = ?
+                ORDER BY length DESC, achieved LIMIT -1 OFFSET ?
+            )
+        ''', (*key, size))
+
+
+class StreakRun:  # 当前连胜
+    """记录连胜的开始/最近答对时间、模式，以及是否全部在三倍模式下完成"""
+
+    def __init__(self, length=0, now=None):
+        # 延续已保存但找不到对应记录的连胜时，模式未知，按混合计
+        self.length = length
+        self.mode = MIXED_MODE if length else None
+        self.triple = False
+        self.started = self.ended = now if now is not None else time.time()
+
+    def resume(self, record):  # 从关闭时写入的未结束连胜 (模式, 三倍, 长度, 开始, 结束) 继续
+        self.mode, triple, self.length, self.started, self.ended = record
+        self.triple = bool(triple)
+
+    def record(self):  # 当前连胜 (模式, 三倍, 长度, 开始, 结束)，没有连胜时为 None
+        return (self.mode, int(self.triple), self.length, self.started, self.ended) if self.length else None
+
+    def answer(self, mode, is_triple_mode, is_correct, now):  # 答错时返回结束的连胜记录
+        if not is_correct:
+            finished = self.record()
+            self.length = 0
+            return finished
+        if self.length == 0:
+            self.mode, self.triple, self.started = mode, is_triple_mode, now
+        elif mode != self.mode:
+            self.mode = MIXED_MODE
+        self.triple = self.triple and is_triple_mode
+        self.length += 1
+        self.ended = now
+        return None
+
+
+class StreakLeaderboard:  # 连胜排行榜
+    """
+    在内存中为每个榜单维护前 size 名（档案 -> (长度, 三倍, 时间)），第一次用到时沿索引从数据库读取，
+    最近用到的 max_boards 个榜单常驻内存。每次答对只和缓存的榜单最后一名比较，
+    排名变化时才产生要写入的行，查询与更新的开销只和 size 有关，与人数、历史长度无关。
+    """
+
+    def __init__(self, connection, size=LEADERBOARD_SIZE, max_boards=256):
+        self.connection = connection  # 返回数据库连接上下文的函数
+        self.size = size
+        self.max_boards = max_boards
+        self.boards = OrderedDict()  # (模式, 周期, 周期键) -> {档案: (长度, 三倍, 时间)}
+        self.lasts = {}  # 已满榜单的最后一名，榜单变动时失效
+        self.day_range = (0, 0)  # 缓存当天的起止时间戳与周期键，避免每次答对都换算日期
+        self.day_keys = None
+
+    def period_keys(self, timestamp):
+        start, end = self.day_range
+        if not start <= timestamp < end:
+            day = datetime.date.fromtimestamp(timestamp)
+            start = datetime.datetime.combine(day, datetime.time.min).timestamp()
+            end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min).timestamp()
+            self.day_range = (start, end)
+            self.day_keys = period_keys(timestamp)
+        return self.day_keys
+
+    def board(self, key):
+        if key in self.boards:
+            self.boards.move_to_end(key)
+            return self.boards[key]
+        return self.add_board(key, self.read_board(key))
+
+    def read_board(self, key):  # 从数据库读取一个榜单，不改动缓存，可在线程池中执行
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT profile, length, triple, achieved FROM leaderboard
+                WHERE mode = ? AND period = ? AND period_key = ?
+                ORDER BY length DESC, achieved LIMIT ?
+            ''', (*key, self.size)).fetchall()
+        return {profile: (length, triple, achieved) for profile, length, triple, achieved in rows}
+
+    def add_board(self, key, board):  # 缓存读取到的榜单；已经缓存时保留缓存中的版本
+        if key in self.boards:
+            self.boards.move_to_end(key)
+            return self.boards[key]
+        self.boards[key] = board
+        while len(self.boards) > self.max_boards:
+            evicted, _ = self.boards.popitem(last=False)
+            self.lasts.pop(evicted, None)
+        return board
+
+    def top_key(self, mode=ALL_MODES, period="all", now=None):  # 榜单对应的 (模式, 周期, 周期键)
+        day, week = self.period_keys(now if now is not None else time.time())
+        return mode, period, {"day": day, "week": week, "all": ""}[period]
+
+    def last(self, key, board):  # 最后一名：长度最短、同长度时达成最晚
+        last = self.lasts.get(key)
+        if last is None:
+            last = self.lasts[key] = min(board, key=lambda name: (board[name][0], -board[name][2]))
+        return last
+
+    def offer(self, profile, run):  # 用当前连胜更新各榜单，返回需要写入的行
+        changes = []
+        for key in leaderboard_keys(run.mode, *self.period_keys(run.ended)):
+            board = self.board(key)
+            current = board.get(profile)
+            if current is not None:
+                if run.length <= current[0]:
+                    continue
+            elif len(board) >= self.size:
+                # 没有超过最后一名时不需要改动榜单
+                last = self.last(key, board)
+                if run.length <= board[last][0]:
+                    continue
+                del board[last]
+            board[profile] = (run.length, int(run.triple), run.ended)
+            self.lasts.pop(key, None)
+            changes.append((*key, profile, run.length, int(run.triple), run.ended))
+        return changes
+
+    def answer(self, profile, run, mode, is_triple_mode, is_correct, now=None):  # 答题后更新连胜与榜单
+        """返回 (结束的连胜记录列表, 榜单变动行)"""
+        now = now if now is not None else time.time()
+        finished = run.answer(mode, is_triple_mode, is_correct, now)
+        records = [(profile, *finished)] if finished is not None else []
+        return records, self.offer(profile, run) if is_correct else []
+
+    def top(self, mode=ALL_MODES, period="all", now=None):  # 榜单，按名次排列的 [(档案, 长度, 三倍, 时间)]
+        board = self.board(self.top_key(mode, period, now))
+        return sorted(((profile, *entry) for profile, entry in board.items()), key=lambda row: (-row[1], row[3]))
+
+    def reload(self):  # 丢弃缓存的榜单，下次用到时重新从数据库读取
+        self.boards.clear()
+        self.lasts.clear()
+
+
+def print_leaderboard(db_path, size=LEADERBOARD_SIZE):  # 输出各模式、各周期的排行榜
+    conn = sqlite3.connect(db_path)
+    create_streak_tables(conn)
+    leaderboard = StreakLeaderboard(lambda: nullcontext(conn), size)
+    for mode in LEADERBOARD_MODES:
+        for period, label in LEADERBOARD_PERIODS.items():
+            rows = leaderboard.top(mode, period)
+            if not rows:
+                continue
+            print(f"[{mode} {label}]")
+            for rank, (profile, length, triple, achieved) in enumerate(rows, 1):
+                achieved_at = datetime.datetime.fromtimestamp(achieved).strftime("%Y-%m-%d %H:%M")
+                print(f"  {rank:>2}. {profile}  {length}{' x3' if triple else ''}  {achieved_at}")
+    conn.close()
+
+
+def create_practice_tables(conn):  # 创建单机练习的统计表
+    cursor = conn.cursor()
+    # 创建连胜和最高纪录表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS streak_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            streak INTEGER DEFAULT 0,
+            high_score INTEGER DEFAULT 0
+        )
+    ''')
+    # 创建正确率统计表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS proficiency_stats (
+            char TEXT PRIMARY KEY,
+            correct INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0
+        )
+    ''')
+    # 创建分模式答题统计表（不计三倍奖励）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mode_stats (
+            mode TEXT,
+            char TEXT,
+            correct INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            PRIMARY KEY (mode, char)
+        )
+    ''')
+    # 创建原始答题记录表与日/周汇总表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL,
+            char TEXT,
+            mode TEXT,
+            correct INTEGER,
+            triple INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attempts_ts ON attempts (ts)')
+    for table, column in (('daily_rollup', 'day'), ('weekly_rollup', 'week')):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {column} TEXT,
+                char TEXT,
+                correct INTEGER DEFAULT 0,
+                total INTEGER DEFAULT 0,
+                PRIMARY KEY ({column}, char)
+            )
+        ''')
+    conn.commit()
+    create_streak_tables(conn)
+
 
 class KanaPracticeApp:
-    def __init__(self, root):  # 初始化
+    def __init__(self, root, db_path='kana_practice.db', adaptive="mode", use_glyph_atlas=False,
+                 seed=None, record_file=None, persist=True, prefetch=8, derange=False,
+                 profile="default"):  # 初始化
         self.root = root
         self.root.title("日语五十音练习")
         # 设置窗口尺寸
         self.root.geometry("1000x1000")
 
         # 添加正确率文件路径
-        import os
         self.stats_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kana_stats.json")
 
         # 数据库路径
-        self.conn = sqlite3.connect('kana_practice.db')
+        self.conn = sqlite3.connect(db_path)
+        # 与服务器一致使用 WAL，多个档案共用数据库时读写互不阻塞
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
         self.create_tables()
         self.load_stats_from_db()
 
+        # 连胜记录与排行榜，同一数据库中的多个档案共用排行榜
+        self.profile = profile
+        self.leaderboard = StreakLeaderboard(lambda: nullcontext(self.conn))
+
+        # 随机数：同一种子下出题、打乱键盘与连连看完全相同，便于录制重放
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 63)
+        self.rng = random.Random(self.seed)
+        # 单词题使用单独的随机数序列，不影响假名题
+        self.word_rng = random.Random(f"{self.seed}-words")
+        # 题目、乱序键盘（derange 时没有按键留在原位）与连连看在空闲时预取
+        self.prefetcher = QuizPrefetcher(self.seed, prefetch, derange)
+        self.prefetch_pending = False
+        self.persist = persist  # 重放时不保存统计数据
+        self.recorder = None
+        self.replaying = False
+
+        # 随机模式：adaptive 为 "mode"/"kana" 时按 Thompson 采样选择，"off" 时均匀随机
+        self.adaptive = adaptive
+        self.mode_selector = AdaptiveModeSelector(adaptive, np.random.default_rng(self.seed)) \
+            if adaptive != "off" else None
+        if self.mode_selector is not None:
+            self.mode_selector.load(self.mode_counts)
+        self.next_index = None  # 随机模式指定的下一题假名序号
+        self.current_index = None  # 当前假名题的序号
+
         # 绑定关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -90,6 +1375,9 @@ class KanaPracticeApp:
         self.current_font = self.ming_font
         self.is_ming_font = True
 
+        # 可选的假名图集渲染，需要 Pillow
+        self.glyph_atlas = GlyphAtlas(root) if use_glyph_atlas and ImageTk is not None else None
+
         # 初始化主题
         self.style = ttk.Style(theme='litera')
         # 初始化时添加用于存储 grid 布局参数的字典
@@ -140,13 +1428,13 @@ class KanaPracticeApp:
 
         self.mode_var = ttk.StringVar()
         self.mode_var.set("片-平")
-        mode_options = ["片-平", "平-片", "平-罗", "罗-平", "片-罗", "罗-片"]
+        mode_options = MODES
         mode_label = ttk.Label(self.mode_frame, text="选择练习模式:", style="Title.TLabel")
         mode_label.pack(side=ttk.LEFT, padx=5)
         mode_menu = ttk.Combobox(self.mode_frame, textvariable=self.mode_var, values=mode_options,
                                  style="Custom.TCombobox")
         mode_menu.pack(side=ttk.LEFT, padx=5)
-        mode_menu.bind("<<ComboboxSelected>>", self.new_question)
+        mode_menu.bind("<<ComboboxSelected>>", self.on_mode_selected)
 
         # 交换模式
         swap_button = ttk.Button(self.mode_frame, text="♻", style="Custom.TButton", command=self.swap_mode)
@@ -194,9 +1482,54 @@ class KanaPracticeApp:
         )
         self.reset_data_btn.pack(side=ttk.LEFT, padx=5)
 
+        # 发音开关按钮，音频包位于程序目录下的 sounds 文件夹
+        self.audio_player = PronunciationPlayer(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "sounds"))
+        self.audio_enabled = False
+        self.audio_btn = ttk.Button(
+            self.mode_frame,
+            text="🔇",
+            style="Custom.TButton",
+            command=self.toggle_audio,
+            width=3,
+            padding=(0, 0, 0, 8)
+        )
+        self.audio_btn.pack(side=ttk.LEFT, padx=5)
+
+        # 手写作答按钮，仅在答案为平/片假名的模式下生效
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        self.recognizer = StrokeRecognizer(os.path.join(app_dir, "kana_strokes.json"),
+                                           os.path.join(app_dir, STROKE_TEMPLATE_FILE))
+        self.handwriting_enabled = False
+        self.strokes = []
+        self.handwriting_btn = ttk.Button(
+            self.mode_frame,
+            text="✍",
+            style="Custom.TButton",
+            command=self.toggle_handwriting,
+            width=3,
+            padding=(0, 0, 0, 8)
+        )
+        self.handwriting_btn.pack(side=ttk.LEFT, padx=5)
+
+        # 单词练习按钮
+        self.word_source = WORD_SOURCE_FILE
+        self.word_index_file = WORD_INDEX_FILE
+        self.word_index = None
+        self.word_drill = False
+        self.word_btn = ttk.Button(
+            self.mode_frame,
+            text="词",
+            style="Custom.TButton",
+            command=self.toggle_word_drill,
+            width=3
+        )
+        self.word_btn.pack(side=ttk.LEFT, padx=5)
+
         # 连胜统计与最高纪录
         self.streak = 0
         self.high_score = 0
+        self.streak_run = StreakRun(self.streak)  # 与界面显示的连胜一致
         self.streak_label = ttk.Label(root, text=f"连胜: {self.streak}", style="TLabel")
         self.streak_label.grid(row=2, column=0, padx=10, pady=5, sticky="w")
         self.high_score_label = ttk.Label(root, text=f"最高纪录: {self.high_score}", style="TLabel")
@@ -236,6 +1569,18 @@ class KanaPracticeApp:
         # 调整字体切换按钮位置
         self.font_btn.grid(row=0, column=2, padx=10, pady=10, sticky="nw")
 
+        # 进度曲线按钮
+        self.progress_chart = None
+        self.progress_window = None
+        self.progress_btn = ttk.Button(
+            root,
+            text="进度曲线",
+            style="Custom.TButton",
+            command=self.show_progress_chart,
+            width=8
+        )
+        self.progress_btn.grid(row=0, column=3, padx=8, pady=10, sticky="nw")
+
         # 熟练度地图页面
         self.proficiency_frame = ttk.Frame(root)
         self.proficiency_label = ttk.Label(self.proficiency_frame, text="熟练度地图", style="Title.TLabel")
@@ -247,6 +1592,7 @@ class KanaPracticeApp:
         )
 
         # 添加加强训练按钮
+        self.intensive_view = None  # 加强训练窗口，第一次打开时创建
         self.intensive_training_btn = ttk.Button(
             self.proficiency_frame,
             text="加强训练",
@@ -263,17 +1609,97 @@ class KanaPracticeApp:
         self.buttons = []
         self.current_answer = None
         self.question_label.config(foreground="black")  # 初始时设置为黑色
+
+        # 录制模式：记录种子、初始统计与之后的每个操作
+        if record_file:
+            self.recorder = SessionRecorder(record_file, self.seed, self.session_snapshot())
+        self.new_question()
+
+    def record(self, event, text=None):  # 录制一个操作
+        if self.recorder is not None:
+            self.recorder.record(event, text)
+
+    def session_snapshot(self):  # 影响出题的初始状态
+        return {
+            'mode': self.mode_var.get(),
+            'adaptive': self.adaptive,
+            'derange': self.prefetcher.derange,
+            'correct_counts': self.correct_counts,
+            'mode_counts': [[mode, char, stats['correct'], stats['total']]
+                            for (mode, char), stats in self.mode_counts.items()],
+            'streak': self.streak,
+            'high_score': self.high_score,
+        }
+
+    def apply_snapshot(self, snapshot):  # 恢复录制开始时的统计状态
+        self.correct_counts = {char: dict(stats) for char, stats in snapshot['correct_counts'].items()}
+        self.mode_counts = {(mode, char): {'correct': correct, 'total': total}
+                            for mode, char, correct, total in snapshot['mode_counts']}
+        if self.mode_selector is not None:
+            self.mode_selector.load(self.mode_counts)
+        self.streak = snapshot['streak']
+        self.high_score = snapshot['high_score']
+        self.streak_run = StreakRun(self.streak)
+        self.streak_label.config(text=f"连胜: {self.streak}")
+        self.high_score_label.config(text=f"最高纪录: {self.high_score}")
+
+    def replay(self, events, on_done=None):  # 在界面中按最快速度重放事件，每个事件之间让出一次事件循环
+        self.replaying = True
+        handlers = {
+            EVENT_MODE: lambda text: (self.mode_var.set(text), self.on_mode_selected()),
+            EVENT_NEXT: lambda text: self.new_question(),
+            EVENT_ANSWER: self.check_answer,
+            EVENT_SWAP: lambda text: self.swap_mode(),
+            EVENT_RANDOM: lambda text: self.random_mode(),
+            EVENT_SHUFFLE: lambda text: self.toggle_keyboard_shuffle(),
+            EVENT_MAP_SHOW: lambda text: self.show_proficiency_map(),
+            EVENT_MAP_HIDE: lambda text: self.hide_proficiency_map(),
+            EVENT_INTENSIVE: lambda text: self.start_intensive_training(),
+            EVENT_WORD_DRILL: lambda text: self.toggle_word_drill(),
+            EVENT_WORD_NEXT: lambda text: self.next_word_question(),
+            EVENT_WORD_ANSWER: self.check_word_answer,
+        }
+        pending = iter(events)
+        start = time.perf_counter()
+
+        def step():
+            for event, _, text in pending:
+                handlers[event](text)
+                self.root.after(0, step)
+                return
+            self.replaying = False
+            print_replay_report(events, time.perf_counter() - start, self.correct_counts,
+                                self.streak, self.high_score)
+            if on_done is not None:
+                on_done()
+
+        self.root.after(0, step)
+
+    def on_mode_selected(self, event=None):  # 下拉框选择模式
+        self.record(EVENT_MODE, self.mode_var.get())
+        self.new_question()
+
+    def next_question(self):  # 作答后自动进入下一题
+        self.record(EVENT_NEXT)
         self.new_question()
 
     def random_mode(self):  # 随机模式
-        """随机选择一种练习模式"""
-        modes = ["片-平", "平-片", "平-罗", "罗-平", "片-罗", "罗-片"]
-        random_mode = random.choice(modes)
+        """随机选择一种练习模式，开启自适应时优先选择常错的模式"""
+        self.record(EVENT_RANDOM)
+        random_mode, self.next_index = pick_random_mode(self.rng, self.mode_selector)
         self.mode_var.set(random_mode)
         self.new_question()
 
     def on_close(self):  # 窗口关闭时执行的操作
+        if self.recorder is not None:
+            self.recorder.close()
         try:
+            if not self.persist:
+                return
+            # 记录尚未结束的连胜，保留真实的开始时间与模式
+            current = self.streak_run.record()
+            if current is not None:
+                write_streaks(self.conn, [(self.profile, *current)], [])
             # 保存统计数据到数据库
             self.save_stats_to_db()
             # 保存统计数据到 JSON 文件
@@ -284,6 +1710,12 @@ class KanaPracticeApp:
             import traceback
             traceback.print_exc()
         finally:
+            # 停止发音线程
+            self.audio_player.close()
+            if self.intensive_view is not None:
+                self.intensive_view.close()
+            if self.word_index is not None:
+                self.word_index.close()
             # 关闭数据库连接
             self.conn.close()
             # 销毁窗口
@@ -352,6 +1784,7 @@ class KanaPracticeApp:
             self.font_btn.config(text="黑")
         self.is_ming_font = not self.is_ming_font
         self.update_font_style()
+        self.refresh_glyphs()
         self.root.update_idletasks()
 
     def toggle_dark_mode(self):  # 切换深色模式
@@ -378,10 +1811,42 @@ class KanaPracticeApp:
                                  background="white",
                                  foreground="black")
             self.question_label.config(foreground="black")
+        self.refresh_glyphs()
         # 刷新布局
         self.root.update_idletasks()
 
+    def glyph_options(self, char, size=12, font=None):  # 图集贴图参数，未启用或找不到字体文件时为空
+        if self.glyph_atlas is None:
+            return {}
+        font_path = self.get_font_path(font or self.current_font)
+        if font_path is None:
+            return {}
+        pixel_size = round(self.root.winfo_fpixels(f"{size}p"))
+        image = self.glyph_atlas.get(font_path, pixel_size, "dark" if self.dark_mode else "light", char)
+        return {'image': image, 'compound': "image"} if image is not None else {}
+
+    def refresh_glyphs(self):  # 主题或字体切换后只替换键盘贴图，不重建按钮
+        if self.glyph_atlas is None:
+            return
+        for button in self.buttons:
+            if button.winfo_exists():
+                button.config(**(self.glyph_options(button.cget("text")) or {'image': "", 'compound': "none"}))
+        if self.proficiency_frame.winfo_ismapped():
+            self.show_proficiency_map()
+
+    def toggle_audio(self):  # 切换发音
+        if not self.audio_player.available:
+            print("未找到发音音频包或音频播放库，发音不可用")
+            return
+        self.audio_enabled = not self.audio_enabled
+        self.audio_btn.config(text="🔊" if self.audio_enabled else "🔇")
+
+    def play_pronunciation(self, char):  # 播放发音
+        if self.audio_enabled:
+            self.audio_player.play(char)
+
     def swap_mode(self):  # 交换模式
+        self.record(EVENT_SWAP)
         mode = self.mode_var.get()
         if "-" in mode:
             left, right = mode.split("-")
@@ -392,51 +1857,202 @@ class KanaPracticeApp:
     def new_question(self, event=None):  # 生成新题目
         self.feedback_label.config(text="")
         mode = self.mode_var.get()
-        index = random.randint(0, len(HIRAGANA) - 1)
-
-        if mode == "片-平":
-            self.question_label.config(text=KATAKANA[index])
-            self.current_answer = HIRAGANA[index]
-        elif mode == "平-片":
-            self.question_label.config(text=HIRAGANA[index])
-            self.current_answer = KATAKANA[index]
-        elif mode == "平-罗":
-            self.question_label.config(text=HIRAGANA[index])
-            self.current_answer = ROMAJI[index]
-        elif mode == "罗-平":
-            self.question_label.config(text=ROMAJI[index])
-            self.current_answer = HIRAGANA[index]
-        elif mode == "片-罗":
-            self.question_label.config(text=KATAKANA[index])
-            self.current_answer = ROMAJI[index]
-        elif mode == "罗-片":
-            self.question_label.config(text=ROMAJI[index])
-            self.current_answer = KATAKANA[index]
-
-        # 只有不在三倍模式时，才重新创建键盘
-        if not self.is_triple_mode:
+        if mode not in MODES:
+            return
+        # 单词练习时也照常取出假名题，出题序列与无界面重放保持一致
+        if self.next_index is not None:
+            index, self.next_index = self.next_index, None
+        else:
+            index = self.prefetcher.next_index()
+        self.current_index = index
+        if self.word_drill:
+            self.new_word_question()
+            return
+        self.show_question(mode, index)
+
+    def redraw_question(self):  # 切换作答方式后重新显示当前题目，不取新题
+        if self.word_drill:
+            return  # 单词题的选项与作答方式无关
+        self.feedback_label.config(text="")
+        mode = self.mode_var.get()
+        if self.current_index is None or mode not in MODES:
+            self.new_question()
+        else:
+            self.show_question(mode, self.current_index, redraw=True)
+
+    def show_question(self, mode, index, redraw=False):  # 显示题目与作答键盘
+        prompt, self.current_answer, _ = make_question(mode, index)
+        self.question_label.config(text=prompt)
+
+        # 播放题目的发音
+        self.play_pronunciation(self.question_label.cget("text"))
+
+        # 手写模式显示手写板；否则只有不在三倍模式时，才重新创建键盘
+        if self.handwriting_available(mode):
+            self.create_handwriting_pad()
+        elif not self.is_triple_mode:
             # 清除旧按钮
             for button in self.buttons:
                 button.destroy()
             self.buttons = []
+            self.create_keyboard(answer_rows(mode))
+        elif redraw:
+            # 从手写切回三倍模式时恢复当前的乱序键盘
+            self.create_keyboard(self.char_rows)
+        self.schedule_prefetch()
+
+    def schedule_prefetch(self):  # 出题后在空闲时补满预取缓冲
+        if not self.prefetch_pending:
+            self.prefetch_pending = True
+            self.root.after_idle(self.fill_prefetch)
+
+    def fill_prefetch(self):
+        self.prefetch_pending = False
+        self.prefetcher.fill(weakest_chars(self.correct_counts, 10))
+
+    def toggle_word_drill(self):  # 切换单词练习
+        if not self.word_drill and self.word_index is None:
+            self.word_index = WordIndex.open(self.word_source, self.word_index_file)
+            if self.word_index is None:
+                self.feedback_label.config(text="未找到单词表 words.txt", foreground="orange")
+                return
+        self.record(EVENT_WORD_DRILL)
+        self.word_drill = not self.word_drill
+        self.word_btn.config(text="字" if self.word_drill else "词")
+        if self.word_drill:
+            self.feedback_label.config(text="")
+            self.new_word_question()
+        else:
+            self.redraw_question()
 
-            if mode == "片-平":
-                self.create_keyboard(HIRAGANA_ROWS)
-            elif mode == "平-片":
-                self.create_keyboard(KATAKANA_ROWS)
-            elif mode == "平-罗":
-                self.create_keyboard(ROMAJI_ROWS)
-            elif mode == "罗-平":
-                self.create_keyboard(HIRAGANA_ROWS)
-            elif mode == "片-罗":
-                self.create_keyboard(ROMAJI_ROWS)
-            elif mode == "罗-片":
-                self.create_keyboard(KATAKANA_ROWS)
+    def new_word_question(self):  # 生成单词题：看单词选罗马字读音
+        for widget in self.keyboard_frame.winfo_children():
+            widget.destroy()
+        self.buttons = []
+
+        question = make_word_question(self.word_index, self.correct_counts, self.word_rng)
+        if question is None:
+            self.question_label.config(text="")
+            self.current_answer = None
+            self.feedback_label.config(text="还没有只由已掌握假名组成的单词，请继续练习单个假名", foreground="orange")
+            return
+        word, gloss, self.current_answer, choices = question
+        self.current_word = (word, gloss)
+
+        self.question_label.config(text=word)
+        self.keyboard_frame.columnconfigure(0, weight=1)
+        for row_num, choice in enumerate(choices):
+            button = ttk.Button(
+                self.keyboard_frame,
+                text=choice,
+                style="Custom.TButton",
+                command=lambda c=choice: self.check_word_answer(c)
+            )
+            button.grid(row=row_num, column=0, padx=3, pady=3, sticky="nsew")
+            self.buttons.append(button)
+
+    def check_word_answer(self, user_answer):  # 检查单词题答案
+        if self.current_answer is None:
+            return
+        self.record(EVENT_WORD_ANSWER, user_answer)
+        word, gloss = self.current_word
+        is_correct = user_answer == self.current_answer
+        self.update_streak(is_correct, WORD_DRILL_MODE)
+        meaning = f"（{gloss}）" if gloss else ""
+        if is_correct:
+            self.feedback_label.config(text=f"√ {word} {self.current_answer}{meaning}", foreground="green")
+        else:
+            self.feedback_label.config(text=f"× {word} {self.current_answer}{meaning}", foreground="red")
+        for button in self.buttons:
+            if button.winfo_exists():
+                if button.cget("text") == self.current_answer:
+                    button.config(bootstyle="success")
+                elif button.cget("text") == user_answer:
+                    button.config(bootstyle="danger")
+        self.current_answer = None  # 防止重复作答
+        # 重放时由录制的“下一道单词题”事件出题
+        if not self.replaying:
+            self.root.after(2000, self.next_word_question)
+
+    def next_word_question(self):  # 作答后自动进入下一道单词题，不消耗假名出题序列
+        if self.word_drill:
+            self.record(EVENT_WORD_NEXT)
+            self.feedback_label.config(text="")
+            self.new_word_question()
+
+    def toggle_handwriting(self):  # 切换手写作答
+        self.handwriting_enabled = not self.handwriting_enabled
+        self.handwriting_btn.config(text="⌨" if self.handwriting_enabled else "✍")
+        self.redraw_question()
+
+    def handwriting_available(self, mode):  # 手写只用于答案为假名的模式
+        return self.handwriting_enabled and mode.split("-")[1] in ("平", "片")
+
+    def create_handwriting_pad(self):  # 创建手写板
+        for widget in self.keyboard_frame.winfo_children():
+            widget.destroy()
+        self.strokes = []
+
+        bg_color = self.style.lookup("TFrame", "background") if self.dark_mode else "white"
+        self.handwriting_canvas = ttk.Canvas(self.keyboard_frame, width=320, height=320,
+                                             background=bg_color, highlightthickness=1)
+        self.handwriting_canvas.grid(row=0, column=0, columnspan=3, pady=5)
+        self.handwriting_canvas.bind("<ButtonPress-1>", self.on_stroke_start)
+        self.handwriting_canvas.bind("<B1-Motion>", self.on_stroke_move)
+
+        for col_num, (text, command) in enumerate([("识别", self.submit_handwriting),
+                                                   ("清除", self.clear_handwriting),
+                                                   ("录入", self.save_handwriting_template)]):
+            ttk.Button(self.keyboard_frame, text=text, style="Custom.TButton",
+                       command=command).grid(row=1, column=col_num, padx=5, pady=5, sticky="ew")
+            self.keyboard_frame.columnconfigure(col_num, weight=1)
+
+    def on_stroke_start(self, event):  # 落笔
+        self.strokes.append([[event.x, event.y]])
+
+    def on_stroke_move(self, event):  # 运笔
+        last_x, last_y = self.strokes[-1][-1]
+        self.strokes[-1].append([event.x, event.y])
+        self.handwriting_canvas.create_line(last_x, last_y, event.x, event.y, width=6, capstyle="round",
+                                            fill="white" if self.dark_mode else "black")
+
+    def clear_handwriting(self):  # 清除笔迹
+        self.strokes = []
+        self.handwriting_canvas.delete("all")
+
+    def submit_handwriting(self):  # 识别笔迹并判题
+        if not self.strokes:
+            return
+        script = SCRIPTS[self.mode_var.get().split("-")[1]]
+        start = time.perf_counter()
+        results = self.recognizer.recognize(self.strokes, candidates=script)
+        elapsed = time.perf_counter() - start
+        if not results:
+            # 与所有模板都相差太大，不当作作答
+            self.clear_handwriting()
+            self.feedback_label.config(text="没有认出写的字，请重写", foreground="orange")
+            return
+        print(f"识别结果: {results}（{elapsed * 1000:.1f} ms）")
+        self.check_answer(results[0][0])
+
+    def save_handwriting_template(self):  # 把当前笔迹录入为正确答案的模板
+        if not self.strokes or self.current_answer is None:
+            return
+        # 只录入与该字符已有模板足够接近的笔迹，避免把乱写存成模板
+        if not self.recognizer.recognize(self.strokes, candidates=[self.current_answer], k=1):
+            self.feedback_label.config(text=f"笔迹与 {self.current_answer} 相差太大，未录入", foreground="orange")
+            return
+        self.recognizer.add_template(self.current_answer, self.strokes)
+        self.clear_handwriting()
+        self.feedback_label.config(text=f"已录入 {self.current_answer} 的笔迹模板", foreground="green")
 
     def toggle_keyboard_shuffle(self):  # 打乱键盘
+        self.record(EVENT_SHUFFLE)
         self.is_triple_mode = not self.is_triple_mode
         self.is_keyboard_shuffled = self.is_triple_mode  # 乱序键盘与三倍状态绑定
         mode = self.mode_var.get()
+        # 单词练习或手写作答时只切换三倍状态，不替换单词选项和手写板；回到键盘作答时再显示乱序键盘
+        show_keyboard = not self.word_drill and not self.handwriting_available(mode)
 
         if self.is_triple_mode:
             self.shuffle_keyboard_btn.config(
@@ -445,29 +2061,12 @@ class KanaPracticeApp:
                 style="Triple.Custom.TButton"  # 使用新样式
             )
             # 每次进入三倍状态，重新生成乱序键盘
-            if mode in ["罗-片", "平-片"]:
-                original_rows = KATAKANA_ROWS.copy()
-                char_list = KATAKANA.copy()
-            elif mode in ["片-平", "罗-平"]:
-                original_rows = HIRAGANA_ROWS.copy()
-                char_list = HIRAGANA.copy()
-            else:  # mode in ["片-罗", "平-罗"]:
-                original_rows = ROMAJI_ROWS.copy()
-                char_list = ROMAJI.copy()
-
-            random.shuffle(char_list)
-            shuffled_rows = []
-            index = 0
-            for row in original_rows:
-                new_row = []
-                for char in row:
-                    if char != " ":
-                        new_row.append(char_list[index])
-                        index += 1
-                    else:
-                        new_row.append(" ")
-                shuffled_rows.append(new_row)
-            self.create_keyboard(shuffled_rows)
+            original_rows = answer_rows(mode)
+            shuffled_rows = self.prefetcher.next_layout(mode.split("-")[1])
+            if show_keyboard:
+                self.create_keyboard(shuffled_rows)
+            else:
+                self.char_rows = shuffled_rows
             self.original_char_rows = original_rows
         else:
             self.shuffle_keyboard_btn.config(
@@ -476,7 +2075,8 @@ class KanaPracticeApp:
                 style="Custom.TButton"  # 恢复原样式
             )
             if self.original_char_rows:
-                self.create_keyboard(self.original_char_rows)
+                if show_keyboard:
+                    self.create_keyboard(self.original_char_rows)
                 # 退出三倍模式后重置原始字符行
                 self.original_char_rows = None
 
@@ -492,7 +2092,18 @@ class KanaPracticeApp:
                     INSERT OR REPLACE INTO proficiency_stats (char, correct, total)
                     VALUES (?, 0, 0)
                 ''', (char,))
+            cursor.execute('DELETE FROM mode_stats')
+            # 清空答题历史
+            for table in ('attempts', 'daily_rollup', 'weekly_rollup'):
+                cursor.execute(f'DELETE FROM {table}')
+            # 清空本档案的连胜记录与上榜成绩
+            for table in ('streak_records', 'leaderboard'):
+                cursor.execute(f'DELETE FROM {table} WHERE profile = ?', (self.profile,))
             self.conn.commit()
+            self.leaderboard.reload()
+            self.streak_run = StreakRun()
+            if self.progress_chart is not None:
+                self.progress_chart.reload()
 
             # 重置内存中的统计数据
             self.streak = 0
@@ -500,6 +2111,9 @@ class KanaPracticeApp:
             self.streak_label.config(text=f"连胜: {self.streak}")
             self.high_score_label.config(text=f"最高纪录: {self.high_score}")
             self.correct_counts = {char: {'correct': 0, 'total': 0} for char in all_chars}
+            self.mode_counts = {}
+            if self.mode_selector is not None:
+                self.mode_selector.load(self.mode_counts)
 
             # 重置 JSON 文件中的统计数据
             import json
@@ -516,53 +2130,37 @@ class KanaPracticeApp:
         event.widget.config(width=size // 10)
 
     def check_answer(self, user_answer):  # 检查答案
+        self.record(EVENT_ANSWER, user_answer)
         # 根据模式确定要更新的字符
         mode = self.mode_var.get()
 
         try:
-            if mode == "片-平":
-                index = KATAKANA.index(self.question_label.cget("text"))
-                target_char = KATAKANA[index]  # 统计片假名
-            elif mode == "平-片":
-                index = HIRAGANA.index(self.question_label.cget("text"))
-                target_char = HIRAGANA[index]  # 统计平假名
-            elif mode == "平-罗":
-                index = HIRAGANA.index(self.question_label.cget("text"))
-                target_char = HIRAGANA[index]  # 统计平假名
-            elif mode == "罗-平":
-                index = ROMAJI.index(self.question_label.cget("text"))
-                target_char = HIRAGANA[index]  # 统计平假名
-            elif mode == "片-罗":
-                index = KATAKANA.index(self.question_label.cget("text"))
-                target_char = KATAKANA[index]  # 统计片假名
-            elif mode == "罗-片":
-                index = ROMAJI.index(self.question_label.cget("text"))
-                target_char = KATAKANA[index]  # 统计片假名
+            target_char = find_target_char(mode, self.question_label.cget("text"))
         except ValueError as e:
             print(f"查找字符时出错: {e}")
             print(f"当前模式: {mode}, 当前问题: {self.question_label.cget('text')}")
             return
 
         # 获取旧统计数据
-        old_correct = self.correct_counts[target_char]['correct']
-        old_total = self.correct_counts[target_char]['total']
-        old_percentage = (old_correct / old_total * 100) if old_total > 0 else 0
+        old_percentage = proficiency_percentage(self.correct_counts[target_char])
 
         # 根据奖励模式更新统计
-        increment = 3 if self.is_triple_mode else 1
-        self.correct_counts[target_char]['total'] += increment
         is_correct = user_answer == self.current_answer
-        if is_correct:
-            self.correct_counts[target_char]['correct'] += increment
+        record_answer(self.correct_counts, target_char, is_correct, self.is_triple_mode)
+        # 按模式记录原始答题结果，供自适应随机模式使用
+        record_answer(self.mode_counts, (mode, target_char), is_correct)
+        self.record_attempt(mode, target_char, is_correct)
+        if self.mode_selector is not None:
+            left, _ = mode.split("-")
+            self.mode_selector.update(mode, SCRIPTS[left].index(self.question_label.cget("text")), is_correct)
+
+        # 播放正确答案的发音
+        self.play_pronunciation(self.current_answer)
 
         # 反馈处理
+        self.update_streak(is_correct, mode)
         if is_correct:
             self.feedback_label.config(text="√", foreground="green")
-            self.streak += 1
-            if self.streak > self.high_score:
-                self.high_score = self.streak
-            self.streak_label.config(text=f"连胜: {self.streak}")
-            self.high_score_label.config(text=f"最高纪录: {self.high_score}")
             # 答对时，正确按键变色
             for button in self.buttons.copy():  # 使用 copy 避免遍历过程中修改列表
                 if button.winfo_exists():  # 检查按钮是否存在
@@ -571,8 +2169,6 @@ class KanaPracticeApp:
                         break
         else:
             self.feedback_label.config(text="×", foreground="red")
-            self.streak = 0
-            self.streak_label.config(text=f"连胜: {self.streak}")
             # 高亮正确答案和错误答案
             for button in self.buttons.copy():  # 使用 copy 避免遍历过程中修改列表
                 if button.winfo_exists():  # 检查按钮是否存在
@@ -582,9 +2178,7 @@ class KanaPracticeApp:
                         button.config(bootstyle="danger")
 
         # 计算新正确率
-        new_correct = self.correct_counts[target_char]['correct']
-        new_total = self.correct_counts[target_char]['total']
-        new_percentage = (new_correct / new_total * 100) if new_total > 0 else 0
+        new_percentage = proficiency_percentage(self.correct_counts[target_char])
 
         # 输出正确率变化
         print(f"目标字符[{target_char}]：{old_percentage:.0f}%→{new_percentage:.0f}%")
@@ -592,7 +2186,24 @@ class KanaPracticeApp:
         # 如果当前显示的是熟练度地图，则刷新它
         if self.proficiency_frame.winfo_ismapped():
             self.show_proficiency_map()
-        self.root.after(2000, self.new_question)
+        # 重放时由录制的“下一题”事件出题
+        if not self.replaying:
+            self.root.after(2000, self.next_question)
+
+    def update_streak(self, is_correct, mode):  # 更新连胜与最高纪录，并记录连胜、更新排行榜
+        records, board_rows = self.leaderboard.answer(self.profile, self.streak_run, mode,
+                                                      self.is_triple_mode, is_correct)
+        if records or board_rows:
+            write_streaks(self.conn, records, board_rows, self.leaderboard.size)
+            self.conn.commit()
+        if is_correct:
+            self.streak += 1
+            if self.streak > self.high_score:
+                self.high_score = self.streak
+            self.high_score_label.config(text=f"最高纪录: {self.high_score}")
+        else:
+            self.streak = 0
+        self.streak_label.config(text=f"连胜: {self.streak}")
 
     def get_combined_proficiency(self, char):  # 获取综合熟练度
         """汇总不同模式下对应假名的熟练度统计"""
@@ -621,7 +2232,8 @@ class KanaPracticeApp:
                         self.keyboard_frame,
                         text=char,
                         style="Custom.TButton",
-                        command=lambda c=char: self.check_answer(c)
+                        command=lambda c=char: self.check_answer(c),
+                        **self.glyph_options(char)
                     )
                     button.grid(row=row_num, column=col_num, padx=3, pady=3, sticky="nsew")
                     self.keyboard_frame.columnconfigure(col_num, weight=1)
@@ -634,10 +2246,7 @@ class KanaPracticeApp:
 
     def create_proficiency_button(self, char, row, col):  # 创建 proficiency 按钮
         # 计算正确率
-        stats = self.correct_counts[char]
-        total = stats['total']
-        correct = stats['correct']
-        percentage = (correct / total * 100) if total > 0 else 0
+        percentage = proficiency_percentage(self.correct_counts[char])
 
         # 创建自定义画布
         canvas = ttk.Canvas(self.proficiency_frame, width=100, height=30, highlightthickness=0)
@@ -663,10 +2272,16 @@ class KanaPracticeApp:
         canvas.create_rectangle(7, 7, 7 + fill_width, 35, fill=fill_color, outline="")
 
         # 显示假名，使用白色字体
-        text_color = "white" if self.dark_mode else "black"
-        canvas.create_text(50, 15, text=char, font=(self.current_font, 12), fill=text_color)
+        glyph = self.glyph_options(char)
+        if glyph:
+            canvas.create_image(50, 15, image=glyph['image'])
+        else:
+            text_color = "white" if self.dark_mode else "black"
+            canvas.create_text(50, 15, text=char, font=(self.current_font, 12), fill=text_color)
 
     def show_proficiency_map(self):  # 显示熟练度地图
+        if not self.proficiency_frame.winfo_ismapped():
+            self.record(EVENT_MAP_SHOW)
         # 仅隐藏练习相关组件
         components = [
             self.mode_frame, self.streak_label, self.high_score_label,
@@ -716,6 +2331,7 @@ class KanaPracticeApp:
         self.back_btn.grid(row=len(HIRAGANA_ROWS) + 1, column=0, columnspan=max_columns, pady=10, sticky="s")
 
     def hide_proficiency_map(self):  # 隐藏熟练度地图
+        self.record(EVENT_MAP_HIDE)
         self.proficiency_frame.grid_remove()
 
         # 恢复练习相关组件
@@ -729,24 +2345,73 @@ class KanaPracticeApp:
         self.root.columnconfigure(2, weight=0)  # 恢复默认权重
 
     def create_tables(self):
+        create_practice_tables(self.conn)
+        self.compact_history()
+
+    def compact_history(self):  # 删除过期的原始答题记录，汇总表在答题时已经增量更新
+        cutoff = time.time() - RAW_HISTORY_DAYS * 86400
+        self.conn.execute('DELETE FROM attempts WHERE ts < ?', (cutoff,))
+        self.conn.commit()
+
+    def record_attempt(self, mode, target_char, is_correct):  # 记录答题并增量更新日/周汇总
+        now = time.time()
+        day, week = period_keys(now)
         cursor = self.conn.cursor()
-        # 创建连胜和最高纪录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS streak_stats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                streak INTEGER DEFAULT 0,
-                high_score INTEGER DEFAULT 0
-            )
-        ''')
-        # 创建正确率统计表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS proficiency_stats (
-                char TEXT PRIMARY KEY,
-                correct INTEGER DEFAULT 0,
-                total INTEGER DEFAULT 0
-            )
-        ''')
+        cursor.execute('INSERT INTO attempts (ts, char, mode, correct, triple) VALUES (?, ?, ?, ?, ?)',
+                       (now, target_char, mode, int(is_correct), int(self.is_triple_mode)))
+        for table, column, period in (('daily_rollup', 'day', day), ('weekly_rollup', 'week', week)):
+            cursor.execute(f'''
+                INSERT INTO {table} ({column}, char, correct, total) VALUES (?, ?, ?, 1)
+                ON CONFLICT ({column}, char) DO UPDATE SET
+                    correct = correct + excluded.correct, total = total + 1
+            ''', (period, target_char, int(is_correct)))
+        # 每题提交，不长时间占用写锁，程序异常退出也不丢失答题记录
         self.conn.commit()
+        if self.progress_chart is not None:
+            self.progress_chart.update()
+
+    def show_progress_chart(self):  # 显示进度曲线窗口
+        if self.progress_window is not None and self.progress_window.winfo_exists():
+            self.progress_window.lift()
+            return
+        self.progress_window = ttk.Toplevel(self.root)
+        self.progress_window.title("进度曲线")
+        self.progress_window.geometry("900x520")
+        self.progress_window.protocol("WM_DELETE_WINDOW", self.close_progress_chart)
+
+        bg_color = self.style.lookup("TFrame", "background") if self.dark_mode else "white"
+        self.progress_chart = ProgressChart(self.progress_window, self.conn, bg_color)
+
+        # 筛选条件：按日/周，全部假名或单个假名
+        controls = ttk.Frame(self.progress_window)
+        controls.pack(side=ttk.TOP, fill="x", padx=10, pady=5)
+        period_var = ttk.StringVar(value="日")
+        char_var = ttk.StringVar(value="全部")
+        period_menu = ttk.Combobox(controls, textvariable=period_var, values=list(ProgressChart.PERIODS),
+                                   width=4, state="readonly")
+        char_menu = ttk.Combobox(controls, textvariable=char_var, values=["全部"] + HIRAGANA + KATAKANA,
+                                 width=6, state="readonly")
+        period_menu.pack(side=ttk.LEFT, padx=5)
+        char_menu.pack(side=ttk.LEFT, padx=5)
+
+        def on_filter_change(event=None):
+            self.progress_chart.period = period_var.get()
+            self.progress_chart.char = None if char_var.get() == "全部" else char_var.get()
+            self.progress_chart.reload()
+
+        period_menu.bind("<<ComboboxSelected>>", on_filter_change)
+        char_menu.bind("<<ComboboxSelected>>", on_filter_change)
+
+        self.progress_chart.canvas.get_tk_widget().pack(side=ttk.TOP, fill="both", expand=True)
+        self.progress_chart.reload()
+
+    def close_progress_chart(self):  # 关闭进度曲线窗口并释放图形
+        if self.progress_chart is not None:
+            self.progress_chart.close()
+            self.progress_chart = None
+        if self.progress_window is not None:
+            self.progress_window.destroy()
+            self.progress_window = None
 
     def load_stats_from_db(self):   # 从数据库加载统计数据
         cursor = self.conn.cursor()
@@ -770,6 +2435,11 @@ class KanaPracticeApp:
             char, correct, total = row
             self.correct_counts[char] = {'correct': correct, 'total': total}
 
+        # 加载分模式统计
+        cursor.execute('SELECT mode, char, correct, total FROM mode_stats')
+        self.mode_counts = {(mode, char): {'correct': correct, 'total': total}
+                            for mode, char, correct, total in cursor.fetchall()}
+
     def save_stats_to_db(self):  # 保存统计数据到数据库
         cursor = self.conn.cursor()
         # 保存连胜和最高纪录
@@ -781,6 +2451,12 @@ class KanaPracticeApp:
                 INSERT OR REPLACE INTO proficiency_stats (char, correct, total)
                 VALUES (?, ?, ?)
             ''', (char, stats['correct'], stats['total']))
+        # 保存分模式统计
+        cursor.executemany('''
+            INSERT OR REPLACE INTO mode_stats (mode, char, correct, total)
+            VALUES (?, ?, ?, ?)
+        ''', [(mode, char, stats['correct'], stats['total'])
+              for (mode, char), stats in self.mode_counts.items()])
         self.conn.commit()
 
     def get_font_path(self, font_name):  # 查找字体文件路径
@@ -789,183 +2465,1290 @@ class KanaPracticeApp:
         :param font_name: 字体名称。
         :return: 找到字体文件路径则返回该路径，否则返回 None。
         """
-        import tkinter.font as tkfont
-        import os
-
-        # 定义常见字体目录
-        font_dirs = [
-            "C:\\Windows\\Fonts",  # Windows 字体目录
-            os.path.expanduser("~/.fonts"),  # Linux 用户字体目录
-            "/usr/share/fonts",  # Linux 系统字体目录
-            "/usr/local/share/fonts"  # Linux 本地字体目录
-        ]
-
-        for font_dir in font_dirs:
-            if os.path.exists(font_dir):
-                for _, _, files in os.walk(font_dir):
-                    for file in files:
-                        if file.lower().endswith(('.ttf', '.otf')):
-                            font_file_path = os.path.join(os.path.dirname(font_dir), file)
-                            try:
-                                # 尝试使用字体文件创建字体对象
-                                font = tkfont.Font(family=font_name, file=font_file_path)
-                                if font.actual('family') == font_name:
-                                    return font_file_path
-                            except Exception:
-                                continue
-        return None
+        if ImageFont is None:
+            return None
+        # 字体目录只扫描一次，之后直接查索引
+        if not FONT_FILES:
+            FONT_FILES.update(scan_font_files())
+        return FONT_FILES.get(FONT_ALIASES.get(font_name, font_name))
 
     def start_intensive_training(self): # 开始加强训练
-        # 创建新窗口
-        intensive_window = ttk.Toplevel(self.root)
-        intensive_window.title("加强训练")
-        intensive_window.geometry("1400x800")
-
-        # 配置窗口的行列权重，使用 grid 布局
-        intensive_window.columnconfigure(0, weight=2)
-        intensive_window.rowconfigure(0, weight=2)
-        intensive_window.rowconfigure(1, weight=6)
-
+        self.record(EVENT_INTENSIVE)
         # 获取熟练度最低且统计次数大于 1 次的前 10 个字符
-        proficiency_scores = []
-        for _, chars in SOUND_MAP.items():
-            for char in chars:
-                stats = self.correct_counts[char]
-                total = stats['total']
-                if total > 1:  # 统计次数大于 1 次
-                    correct = stats['correct']
-                    percentage = correct / total
-                    proficiency_scores.append((char, percentage))
-
-        proficiency_scores.sort(key=lambda x: x[1])
-        top_10_chars = [char for char, _ in proficiency_scores[:10]]
+        top_10_chars = weakest_chars(self.correct_counts, 10)
 
         # 生成连连看字符列表
-        char_list = []
-        for char in top_10_chars:
-            for _, chars in SOUND_MAP.items():
-                if char in chars:
-                    # 添加平假名、片假名、罗马字以及其中任意一个符号
-                    char_list.extend(chars)
-                    char_list.append(random.choice(chars))
-                    break
-
-        # 确保每个字符出现偶数次
-        char_list *= 2
-        random.shuffle(char_list)
+        char_list = self.prefetcher.next_board(top_10_chars)
+        if not top_10_chars:
+            print("没有足够的数据来生成词云，请进行更多练习。")
+            return
 
         # 自动查找字体文件路径
         font_path = self.get_font_path(self.current_font)
         if font_path is None:
             font_path = 'simhei.ttf'  # 修正字体文件扩展名
 
-        # 生成词云
-        wordcloud_dict = {char: 1 / (i + 1) for i, char in enumerate(top_10_chars)}
-        if not wordcloud_dict:
-            print("没有足够的数据来生成词云，请进行更多练习。")
-            return
+        # 加强训练窗口只创建一次，之后重复使用
+        if self.intensive_view is None:
+            self.intensive_view = IntensiveTrainingView(self)
+        self.intensive_view.show(top_10_chars, char_list, font_path)
+
+    def check_intensive_memory(self, opens=100):  # 反复打开、关闭加强训练窗口，输出内存占用
+        tracemalloc.start()
+        samples = []
+
+        def step(i=0):
+            if i == opens:
+                growth = (samples[-1][1] - samples[0][1]) / 1024 if len(samples) > 1 else 0
+                print(f"第 {samples[0][0]} 次到第 {samples[-1][0]} 次之间 Python 分配增长 {growth:.1f} KiB")
+                tracemalloc.stop()
+                self.on_close()
+                return
+            self.start_intensive_training()
+            self.root.update()
+            if self.intensive_view is not None:
+                self.intensive_view.hide()
+            if (i + 1) % 10 == 0:
+                gc.collect()
+                traced, rss = memory_usage()
+                samples.append((i + 1, traced))
+                rss_text = f"{rss / 1024 / 1024:.1f} MiB" if rss is not None else "-"
+                print(f"打开 {i + 1} 次: Python 分配 {traced / 1024:.1f} KiB  RSS {rss_text}")
+            self.root.after(0, step, i + 1)
+
+        self.root.after(0, step)
+
+
+# ---------------- 多人练习服务器 ----------------
+
+def create_learner_tables(conn):  # 创建多用户统计表
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS learner_proficiency (
+            learner TEXT,
+            char TEXT,
+            correct INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            PRIMARY KEY (learner, char)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS learner_streak (
+            learner TEXT PRIMARY KEY,
+            streak INTEGER DEFAULT 0,
+            high_score INTEGER DEFAULT 0
+        )
+    ''')
+    # 分模式答题统计（不计三倍奖励），供 🎲 自适应随机模式使用
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS learner_mode_stats (
+            learner TEXT,
+            mode TEXT,
+            char TEXT,
+            correct INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            PRIMARY KEY (learner, mode, char)
+        )
+    ''')
+    conn.commit()
+    create_streak_tables(conn)
+
+
+class SQLitePool:  # SQLite 连接池
+    """固定大小的连接池，WAL 模式下读连接可以与写连接并发"""
+
+    def __init__(self, db_path, size=4):
+        self.db_path = db_path
+        self.connections = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.connections.put(conn)
+        with self.connection() as conn:
+            create_learner_tables(conn)
+
+    @contextmanager
+    def connection(self):  # 借出一个连接，用完归还
+        conn = self.connections.get()
+        try:
+            yield conn
+        finally:
+            self.connections.put(conn)
 
-        wc = WordCloud(font_path=font_path, background_color='white' if not self.dark_mode else self.style.lookup("TFrame", "background"), prefer_horizontal=1)
-        wc.generate_from_frequencies(wordcloud_dict)
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get_nowait().close()
 
-        # 显示词云
-        fig = plt.Figure(figsize=(6, 2), dpi=100)
 
-        # 设置图形背景颜色
-        if self.dark_mode:
-            fig.set_facecolor(self.style.lookup("TFrame", "background"))
-        else:
-            fig.set_facecolor("white")        
-
-        ax = fig.add_subplot(111)
-        ax.imshow(wc, interpolation='bilinear')
-        ax.axis("off")
-        canvas = FigureCanvasTkAgg(fig, master=intensive_window)
-        canvas.draw()
-        # 获取当前全局背景颜色
-        if self.dark_mode:
-            bg_color = self.style.lookup("TFrame", "background")
+class LearnerState:  # 单个学习者的练习状态
+    """
+    不依赖界面的练习逻辑：服务器为每个学习者保存一份，无界面重放也用它执行事件。
+    随机数的消耗顺序与 KanaPracticeApp 保持一致，同一种子下两者出题相同。
+    """
+
+    def __init__(self, learner_id, correct_counts=None, streak=0, high_score=0, rng=None, selector=None,
+                 prefetcher=None, word_rng=None):
+        self.learner_id = learner_id
+        self.correct_counts = {char: {'correct': 0, 'total': 0} for char in HIRAGANA + KATAKANA + ROMAJI}
+        self.correct_counts.update(correct_counts or {})
+        self.mode_counts = {}
+        self.streak = streak
+        self.high_score = high_score
+        self.mode = MODES[0]
+        self.is_triple_mode = False
+        self.keyboard = answer_rows(self.mode)
+        self.current = None  # (题目, 答案, 统计字符)
+        self.current_index = None
+        self.answered = False
+        self.next_index = None
+        self.rng = rng if rng is not None else random.Random()
+        self.selector = selector
+        self.prefetcher = prefetcher if prefetcher is not None else QuizPrefetcher()
+        # 单词练习：开启时由调用方提供单词索引
+        self.word_index = None
+        self.word_rng = word_rng if word_rng is not None else random.Random()
+        self.word_drill = False
+        self.current_word = None  # (单词, 释义, 答案, 选项)
+        # 连胜记录由服务器在判题后更新
+        self.run = StreakRun(streak)
+        self.streak_history = deque(maxlen=STREAK_HISTORY)
+
+    def set_mode(self, mode):
+        if mode not in MODES:
+            raise ValueError(f"未知模式: {mode}")
+        self.mode = mode
+        # 与界面一致：三倍模式下键盘保持进入时的乱序布局
+        if not self.is_triple_mode:
+            self.keyboard = answer_rows(mode)
+
+    def set_triple_mode(self, is_triple_mode):  # 进入三倍模式时打乱一次键盘
+        if is_triple_mode == self.is_triple_mode:
+            return
+        self.is_triple_mode = is_triple_mode
+        script = self.mode.split("-")[1]
+        self.keyboard = self.prefetcher.next_layout(script) if is_triple_mode else SCRIPT_ROWS[script]
+
+    def new_question(self, mode=None, is_triple_mode=None):  # 生成新题目
+        if mode is not None:
+            self.set_mode(mode)
+        if is_triple_mode is not None:
+            self.set_triple_mode(is_triple_mode)
+        if self.next_index is not None:
+            index, self.next_index = self.next_index, None
         else:
-            bg_color = "#f5f5f5"
-        # 设置画布对应 tkinter 组件的背景颜色
-        canvas.get_tk_widget().config(background=bg_color)
-        canvas.get_tk_widget().grid(row=0, column=0, sticky="ew")
+            index = self.prefetcher.next_index()
+        self.current = make_question(self.mode, index)
+        self.current_index = index
+        self.answered = False
+        # 与界面一致：单词练习时照常取出假名题，再出一道单词题
+        if self.word_drill:
+            self.new_word_question()
+        return {'mode': self.mode, 'prompt': self.current[0], 'triple': self.is_triple_mode,
+                'keyboard': self.keyboard}
+
+    def random_mode(self, is_triple_mode=None):  # 随机模式
+        mode, self.next_index = pick_random_mode(self.rng, self.selector)
+        return self.new_question(mode, is_triple_mode)
 
+    def swap_mode(self):  # 交换模式
+        left, right = self.mode.split("-")
+        return self.new_question(f"{right}-{left}")
+
+    def set_word_drill(self, word_drill):  # 切换单词练习，开启时出一道单词题
+        if word_drill and self.word_index is None:
+            raise LookupError("没有单词索引")
+        self.word_drill = word_drill
+        if word_drill:
+            self.new_word_question()
+
+    def new_word_question(self):  # 生成单词题，没有可出的单词时为 None
+        self.current_word = make_word_question(self.word_index, self.correct_counts, self.word_rng)
+        return self.current_word
+
+    def check_word_answer(self, user_answer):  # 检查单词题答案，返回是否答对
+        if self.current_word is None:
+            raise LookupError("当前没有单词题")
+        is_correct = user_answer == self.current_word[2]
+        self.current_word = None
+        self.update_streak(is_correct)
+        return is_correct
+
+    def update_streak(self, is_correct):  # 更新连胜与最高纪录
+        if is_correct:
+            self.streak += 1
+            self.high_score = max(self.high_score, self.streak)
+        else:
+            self.streak = 0
 
+    def check_answer(self, user_answer):  # 检查答案，返回统计字符与判题结果
+        if self.current is None:
+            raise LookupError("当前没有题目")
+        _, answer, target_char = self.current
+        is_correct = user_answer == answer
+        record_answer(self.correct_counts, target_char, is_correct, self.is_triple_mode)
+        record_answer(self.mode_counts, (self.mode, target_char), is_correct)
+        if self.selector is not None:
+            self.selector.update(self.mode, self.current_index, is_correct)
+        self.update_streak(is_correct)
+        self.answered = True
+        return target_char, {
+            'correct': is_correct,
+            'answer': answer,
+            'streak': self.streak,
+            'high_score': self.high_score,
+            'percentage': proficiency_percentage(self.correct_counts[target_char]),
+        }
+
+
+class BatchedStatsWriter:  # 批量写入器
+    """
+    收集有改动的 (学习者, 字符)，定时或攒够一批后在单独的写线程中用一个事务写入，
+    请求处理不等待磁盘。
+    """
+
+    def __init__(self, pool, flush_interval=0.2, batch_size=1000):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.dirty_chars = {}  # learner_id -> set(char)
+        self.dirty_mode_chars = {}  # learner_id -> set((模式, 字符))
+        self.dirty_states = {}  # learner_id -> LearnerState
+        self.streak_records = []
+        self.board_rows = []
+        self.pending = 0
+        self.wakeup = asyncio.Event()
+        self.stopping = False
+        self.task = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stats-writer")
+        # 写入统计，供压测计算写放大
+        self.answers_recorded = 0
+        self.rows_written = 0
+        self.transactions = 0
+
+    def mark_dirty(self, state, char):  # 记录一次答题，state.mode 为这道题的模式
+        self.dirty_states[state.learner_id] = state
+        self.dirty_chars.setdefault(state.learner_id, set()).add(char)
+        self.dirty_mode_chars.setdefault(state.learner_id, set()).add((state.mode, char))
+        self.answers_recorded += 1
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.wakeup.set()
+
+    def add_streaks(self, records, board_rows):  # 结束的连胜与排行榜变动随下一批写入
+        self.streak_records.extend(records)
+        self.board_rows.extend(board_rows)
+
+    def start(self):  # 启动写入循环
+        self.stopping = False
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):  # 停止写入循环并写入剩余数据
+        self.stopping = True
+        self.wakeup.set()
+        if self.task is not None:
+            await self.task
+            self.task = None
+        await self.flush()
+
+    async def run(self):  # 写入循环
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self.dirty_states and not self.streak_records:
+            return
+        # 在事件循环线程中拍快照，写线程只接触快照出的行数据
+        proficiency_rows = []
+        mode_rows = []
+        streak_rows = []
+        for learner_id, state in self.dirty_states.items():
+            for char in self.dirty_chars.get(learner_id, ()):
+                stats = state.correct_counts[char]
+                proficiency_rows.append((learner_id, char, stats['correct'], stats['total']))
+            for mode, char in self.dirty_mode_chars.get(learner_id, ()):
+                stats = state.mode_counts[(mode, char)]
+                mode_rows.append((learner_id, mode, char, stats['correct'], stats['total']))
+            streak_rows.append((learner_id, state.streak, state.high_score))
+        streak_records, board_rows = self.streak_records, self.board_rows
+        self.dirty_states = {}
+        self.dirty_chars = {}
+        self.dirty_mode_chars = {}
+        self.streak_records = []
+        self.board_rows = []
+        self.pending = 0
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._write, proficiency_rows, mode_rows, streak_rows,
+                                   streak_records, board_rows)
+
+    def _write(self, proficiency_rows, mode_rows, streak_rows, streak_records, board_rows):
+        with self.pool.connection() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO learner_proficiency (learner, char, correct, total)
+                VALUES (?, ?, ?, ?)
+            ''', proficiency_rows)
+            conn.executemany('''
+                INSERT OR REPLACE INTO learner_mode_stats (learner, mode, char, correct, total)
+                VALUES (?, ?, ?, ?, ?)
+            ''', mode_rows)
+            conn.executemany('''
+                INSERT OR REPLACE INTO learner_streak (learner, streak, high_score)
+                VALUES (?, ?, ?)
+            ''', streak_rows)
+            write_streaks(conn, streak_records, board_rows)
+            conn.commit()
+        self.rows_written += (len(proficiency_rows) + len(mode_rows) + len(streak_rows) + len(streak_records)
+                              + len(board_rows))
+        self.transactions += 1
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class QuizError(Exception):  # 请求错误，附带 HTTP 状态码
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_json_object(data, message):  # 解析 JSON 对象，格式不对时抛出 400
+    try:
+        value = json.loads(data.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise QuizError(400, message)
+    if not isinstance(value, dict):
+        raise QuizError(400, message)
+    return value
+
+
+def parse_triple(params):  # triple 参数，查询字符串中为 "1"/"true"/"yes"
+    triple = params.get('triple')
+    if isinstance(triple, str):
+        triple = triple.lower() in ('1', 'true', 'yes')
+    return triple
+
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                409: "Conflict", 500: "Internal Server Error"}
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+async def read_websocket_frame(reader):  # 读取一个 WebSocket 帧
+    """返回 (opcode, payload)；不支持分片消息，练习消息都很短"""
+    head = await reader.readexactly(2)
+    opcode = head[0] & 0x0F
+    masked = head[1] & 0x80
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length)
+    if mask and length:
+        # 整体异或解掩码，避免逐字节循环
+        key = (mask * (length // 4 + 1))[:length]
+        payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+    return opcode, payload
+
+
+def encode_websocket_frame(payload, opcode=0x1):  # 编码服务端帧（不加掩码）
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class QuizServer:  # 多人练习服务器
+    """
+    基于 asyncio 的 HTTP/WebSocket 服务。所有学习者状态保存在内存中，
+    统计数据通过 BatchedStatsWriter 批量写入 SQLite。
+
+    HTTP 接口（JSON，支持 keep-alive）：
+        GET  /learners/<id>/question?mode=片-平&triple=0
+        GET  /learners/<id>/random?triple=0    🎲 随机模式出题，按该学习者各模式的答题结果自适应选择
+        POST /learners/<id>/answer        {"answer": "あ"}
+        GET  /learners/<id>/proficiency
+        GET  /learners/<id>/weakest?n=10
+        GET  /learners/<id>/streaks       当前连胜与最近的连胜记录
+        GET  /leaderboard?mode=全部&period=week   连胜排行榜，period 为 day/week/all
+        GET  /stats?flush=1               写入统计（压测用）
+    WebSocket：/learners/<id>/ws，每条消息为 {"op": "question", ...}，参数与 HTTP 接口相同
+    """
+
+    def __init__(self, db_path='kana_practice.db', pool_size=4, flush_interval=0.2, adaptive="mode"):
+        self.pool = SQLitePool(db_path, pool_size)
+        self.adaptive = adaptive  # 🎲 随机模式的选择方式，与界面的 --adaptive 相同
+        self.writer = BatchedStatsWriter(self.pool, flush_interval)
+        self.leaderboard = StreakLeaderboard(self.pool.connection)
+        self.learners = {}  # learner_id -> LearnerState
+        self.loading = {}  # learner_id -> Future，避免同一学习者被并发加载两次
+        self.loading_boards = {}  # 榜单键 -> Future，避免同一榜单被并发读取两次
+        self.operations = {
+            'question': self.op_question,
+            'random': self.op_random,
+            'answer': self.op_answer,
+            'proficiency': self.op_proficiency,
+            'weakest': self.op_weakest,
+            'streaks': self.op_streaks,
+        }
+        self.server = None
+
+    def _load_learner(self, learner_id):  # 在线程池中从数据库读取学习者
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT char, correct, total FROM learner_proficiency WHERE learner = ?',
+                           (learner_id,))
+            correct_counts = {char: {'correct': correct, 'total': total}
+                              for char, correct, total in cursor.fetchall()}
+            cursor.execute('SELECT streak, high_score FROM learner_streak WHERE learner = ?', (learner_id,))
+            result = cursor.fetchone() or (0, 0)
+            cursor.execute('SELECT mode, char, correct, total FROM learner_mode_stats WHERE learner = ?',
+                           (learner_id,))
+            mode_counts = {(mode, char): {'correct': correct, 'total': total}
+                           for mode, char, correct, total in cursor.fetchall()}
+            cursor.execute('''
+                SELECT id, profile, mode, triple, length, started, ended FROM streak_records
+                WHERE profile = ? ORDER BY ended DESC LIMIT ?
+            ''', (learner_id, STREAK_HISTORY))
+            history = cursor.fetchall()
+            state = LearnerState(learner_id, correct_counts, *result)
+            state.mode_counts = mode_counts
+            if self.adaptive != "off":
+                state.selector = AdaptiveModeSelector(self.adaptive)
+                state.selector.load(mode_counts)
+            # 服务器停止时写入了未结束的连胜：删除这条记录，连胜结束时再写入完整记录
+            if state.streak and history and history[0][4] == state.streak:
+                record_id, _, *current = history.pop(0)
+                state.run.resume(current)
+                conn.execute('DELETE FROM streak_records WHERE id = ?', (record_id,))
+                conn.commit()
+        state.streak_history.extend(row[1:] for row in reversed(history))
+        return state
+
+    async def get_learner(self, learner_id):  # 获取学习者状态，首次访问时加载
+        state = self.learners.get(learner_id)
+        if state is not None:
+            return state
+        future = self.loading.get(learner_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(None, self._load_learner, learner_id)
+            self.loading[learner_id] = future
+            try:
+                state = await future
+            finally:
+                del self.loading[learner_id]
+            self.learners[learner_id] = state
+            return state
+        return await asyncio.shield(future)
+
+    async def load_boards(self, keys):  # 在线程池中读取尚未缓存的榜单，之后同步更新榜单时不再阻塞事件循环
+        loop = asyncio.get_running_loop()
+        pending, futures, started = [], [], []
+        for key in keys:
+            if key in self.leaderboard.boards:
+                continue
+            future = self.loading_boards.get(key)
+            if future is None:
+                future = self.loading_boards[key] = loop.run_in_executor(None, self.leaderboard.read_board, key)
+                started.append(key)
+            pending.append(key)
+            futures.append(asyncio.shield(future))
+        if not futures:
+            return
+        try:
+            boards = await asyncio.gather(*futures)
+        finally:
+            for key in started:
+                del self.loading_boards[key]
+        for key, board in zip(pending, boards):
+            self.leaderboard.add_board(key, board)
 
-        # 生成连连看游戏布局
-        game_frame = ttk.Frame(intensive_window)
-        game_frame.grid(row=1, column=0, sticky="nsew")
+    def op_question(self, state, params):
+        try:
+            return state.new_question(params.get('mode'), parse_triple(params))
+        except ValueError as e:
+            raise QuizError(400, str(e))
+
+    def op_random(self, state, params):  # 🎲 随机模式
+        return state.random_mode(parse_triple(params))
+
+    async def op_answer(self, state, params):
+        if 'answer' not in params:
+            raise QuizError(400, "缺少 answer 参数")
+        if not isinstance(params['answer'], str):
+            raise QuizError(400, "answer 必须是字符串")
+        if state.current is None or state.answered:
+            raise QuizError(409, "当前没有题目")
+        # 答对时要更新的榜单先在线程池中读好；等待期间可能有同一学习者的其他请求，之后重新检查
+        await self.load_boards(leaderboard_keys(state.mode, *self.leaderboard.period_keys(time.time())))
+        if state.current is None or state.answered:
+            raise QuizError(409, "当前没有题目")
+        target_char, result = state.check_answer(params['answer'])
+        self.writer.mark_dirty(state, target_char)
+        records, board_rows = self.leaderboard.answer(state.learner_id, state.run, state.mode,
+                                                      state.is_triple_mode, result['correct'])
+        state.streak_history.extend(records)
+        self.writer.add_streaks(records, board_rows)
+        return result
+
+    def op_proficiency(self, state, params):
+        return {char: {**stats, 'percentage': proficiency_percentage(stats)}
+                for char, stats in state.correct_counts.items()}
+
+    def op_weakest(self, state, params):
+        try:
+            n = int(params.get('n', 10))
+        except (TypeError, ValueError):
+            raise QuizError(400, "n 必须是整数")
+        return {'weakest': weakest_chars(state.correct_counts, n)}
+
+    def op_streaks(self, state, params):
+        run = state.run
+        return {
+            'current': {'mode': run.mode, 'triple': bool(run.triple), 'length': run.length,
+                        'started': run.started, 'ended': run.ended} if run.length else None,
+            'history': [{'mode': mode, 'triple': bool(triple), 'length': length, 'started': started, 'ended': ended}
+                        for _, mode, triple, length, started, ended in reversed(state.streak_history)],
+        }
+
+    async def op_leaderboard(self, params):
+        mode = params.get('mode', ALL_MODES)
+        period = params.get('period', "all")
+        if mode not in LEADERBOARD_MODES:
+            raise QuizError(400, f"未知模式: {mode}")
+        if period not in LEADERBOARD_PERIODS:
+            raise QuizError(400, f"未知周期: {period}")
+        await self.load_boards([self.leaderboard.top_key(mode, period)])
+        return {'mode': mode, 'period': period, 'leaders': [
+            {'learner': profile, 'length': length, 'triple': bool(triple), 'achieved': achieved}
+            for profile, length, triple, achieved in self.leaderboard.top(mode, period)]}
+
+    async def dispatch(self, learner_id, op, params):  # 执行一个操作
+        handler = self.operations.get(op)
+        if handler is None:
+            raise QuizError(404, f"未知操作: {op}")
+        state = await self.get_learner(learner_id)
+        result = handler(state, params)
+        return await result if asyncio.iscoroutine(result) else result
+
+    async def handle_connection(self, reader, writer):  # 处理一个 TCP 连接
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                url = urlsplit(target)
+                parts = [part for part in url.path.split('/') if part]
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    if len(parts) == 3 and parts[0] == 'learners' and parts[2] == 'ws':
+                        await self.handle_websocket(parts[1], headers, reader, writer)
+                    break
 
-        # 计算合适的行数和列数
-        n = len(char_list)
-        rows = int(np.sqrt(n))
-        while n % rows != 0:
-            rows -= 1
-        cols = n // rows
+                status, payload = await self.handle_http(method, parts, url.query, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f"{version} {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def storage_stats(self):  # 服务器与写入器统计
+        db_bytes = sum(os.path.getsize(path) for path in (self.pool.db_path, self.pool.db_path + '-wal')
+                       if os.path.exists(path))
+        return {
+            'learners': len(self.learners),
+            'answers_recorded': self.writer.answers_recorded,
+            'rows_written': self.writer.rows_written,
+            'transactions': self.writer.transactions,
+            'db_bytes': db_bytes,
+        }
+
+    async def handle_http(self, method, parts, query, body):  # 处理一个 HTTP 请求，返回 (状态码, JSON)
+        try:
+            return 200, await self.route_http(method, parts, query, body)
+        except QuizError as e:
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            # 处理请求时的意外错误返回 500，不断开连接
+            print(f"处理请求 {method} /{'/'.join(parts)} 时出错: {e!r}", file=sys.stderr)
+            return 500, {'error': "服务器内部错误"}
+
+    async def route_http(self, method, parts, query, body):  # 按路径分发 HTTP 请求，出错时抛出 QuizError
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        if parts == ['stats']:
+            if 'flush' in params:
+                await self.writer.flush()
+            return self.storage_stats()
+        if parts == ['leaderboard']:
+            return await self.op_leaderboard(params)
+        if len(parts) != 3 or parts[0] != 'learners':
+            raise QuizError(404, "未知路径")
+        learner_id, op = parts[1], parts[2]
+        if (op == 'answer') != (method == 'POST'):
+            raise QuizError(405, f"{op} 不支持 {method}")
+        if body:
+            params.update(parse_json_object(body, "请求体必须是 JSON 对象"))
+        return await self.dispatch(learner_id, op, params)
+
+    async def handle_websocket(self, learner_id, headers, reader, writer):  # WebSocket 会话
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('latin-1')).digest()).decode('latin-1')
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\n"
+                      "Upgrade: websocket\r\n"
+                      "Connection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+        while True:
+            opcode, payload = await read_websocket_frame(reader)
+            if opcode == 0x8:  # 关闭
+                writer.write(encode_websocket_frame(payload[:2], 0x8))
+                await writer.drain()
+                break
+            if opcode == 0x9:  # ping
+                writer.write(encode_websocket_frame(payload, 0xA))
+                await writer.drain()
+                continue
+            if opcode != 0x1:
+                continue
+            try:
+                params = parse_json_object(payload, "消息必须是 JSON 对象")
+                response = await self.dispatch(learner_id, params.pop('op', None), params)
+            except QuizError as e:
+                response = {'error': str(e), 'status': e.status}
+            except Exception as e:
+                print(f"处理 WebSocket 消息时出错: {e!r}", file=sys.stderr)
+                response = {'error': "服务器内部错误", 'status': 500}
+            writer.write(encode_websocket_frame(json.dumps(response, ensure_ascii=False).encode('utf-8')))
+            await writer.drain()
+
+    async def start(self, host='127.0.0.1', port=8765):
+        self.writer.start()
+        self.server = await asyncio.start_server(self.handle_connection, host, port, backlog=4096)
+        return self.server
+
+    async def stop(self):  # 停止服务并写入剩余数据
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        # 记录尚未结束的连胜，重新加载学习者时从这条记录继续
+        self.writer.add_streaks([(learner_id, *state.run.record()) for learner_id, state in self.learners.items()
+                                 if state.run.length], [])
+        await self.writer.stop()
+        self.writer.close()
+        self.pool.close()
+
+
+def run_server(host, port, db_path, adaptive="mode"):  # 启动多人练习服务器
+    async def main():
+        server = QuizServer(db_path, adaptive=adaptive)
+        await server.start(host, port)
+        print(f"练习服务器已启动: http://{host}:{port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+            print("数据保存成功")
 
-        board = np.array(char_list).reshape(rows, cols)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+# ---------------- 练习录制与重放 ----------------
+
+SESSION_MAGIC = b"KANAREC2"
+SESSION_HEADER = struct.Struct("<8sQI")  # 魔数, 随机种子, 初始状态长度
+EVENT_HEADER = struct.Struct("<BI")  # 事件类型, 距开始的毫秒数
+# 事件类型，MODE、ANSWER 与 WORD_ANSWER 带一个字符串参数
+(EVENT_MODE, EVENT_NEXT, EVENT_ANSWER, EVENT_SWAP, EVENT_RANDOM, EVENT_SHUFFLE,
+ EVENT_MAP_SHOW, EVENT_MAP_HIDE, EVENT_INTENSIVE, EVENT_WORD_DRILL, EVENT_WORD_NEXT, EVENT_WORD_ANSWER) = range(1, 13)
+EVENTS_WITH_TEXT = (EVENT_MODE, EVENT_ANSWER, EVENT_WORD_ANSWER)
+
+
+class SessionRecorder:  # 练习录制
+    """
+    文件头记录随机种子与开始时的统计快照（zlib 压缩的 JSON），之后每个事件为
+    1 字节类型 + 4 字节毫秒时间戳，切换模式与作答（含单词题）再跟 1 字节长度的 UTF-8 字符串。
+    """
+
+    def __init__(self, path, seed, snapshot):
+        self.file = open(path, 'wb')
+        state = zlib.compress(json.dumps(snapshot, ensure_ascii=False).encode('utf-8'))
+        self.file.write(SESSION_HEADER.pack(SESSION_MAGIC, seed, len(state)) + state)
+        self.start = time.perf_counter()
+
+    def record(self, event, text=None):
+        elapsed_ms = int((time.perf_counter() - self.start) * 1000)
+        data = EVENT_HEADER.pack(event, elapsed_ms)
+        if event in EVENTS_WITH_TEXT:
+            encoded = text.encode('utf-8')[:255]
+            data += bytes([len(encoded)]) + encoded
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+def read_session(path):  # 读取录制文件，返回 (随机种子, 初始状态, [(事件, 毫秒, 参数), ...])
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, seed, state_length = SESSION_HEADER.unpack_from(data)
+    if magic != SESSION_MAGIC:
+        raise ValueError(f"不是练习录制文件: {path}")
+    position = SESSION_HEADER.size
+    snapshot = json.loads(zlib.decompress(data[position:position + state_length]).decode('utf-8'))
+    position += state_length
+    events = []
+    while position + EVENT_HEADER.size <= len(data):
+        event, elapsed_ms = EVENT_HEADER.unpack_from(data, position)
+        position += EVENT_HEADER.size
+        text = None
+        if event in EVENTS_WITH_TEXT:
+            length = data[position]
+            text = data[position + 1:position + 1 + length].decode('utf-8')
+            position += 1 + length
+        events.append((event, elapsed_ms, text))
+    return seed, snapshot, events
+
+
+def session_digest(correct_counts, streak, high_score):  # 练习结果摘要，用于比对两次重放是否一致
+    practiced = sorted((char, stats) for char, stats in correct_counts.items() if stats['total'])
+    data = json.dumps([practiced, streak, high_score], ensure_ascii=False)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:12]
+
+
+def print_replay_report(events, elapsed, correct_counts, streak, high_score):  # 输出重放报告
+    answers = sum(1 for event, _, _ in events if event in (EVENT_ANSWER, EVENT_WORD_ANSWER))
+    duration = events[-1][1] / 1000 if events else 0
+    print(f"事件数: {len(events)}  作答: {answers}  原始时长: {duration:.1f}s")
+    print(f"重放用时: {elapsed * 1000:.1f}ms，{len(events) / max(elapsed, 1e-9):.0f} 事件/s")
+    print(f"连胜: {streak}  最高纪录: {high_score}  "
+          f"结果摘要: {session_digest(correct_counts, streak, high_score)}")
+
+
+def replay_session_headless(path):  # 无界面重放：用与界面相同的练习逻辑按最快速度执行事件
+    seed, snapshot, events = read_session(path)
+    state = LearnerState("replay", snapshot['correct_counts'], snapshot['streak'], snapshot['high_score'],
+                         rng=random.Random(seed),
+                         prefetcher=QuizPrefetcher(seed, derange=snapshot.get('derange', False)),
+                         word_rng=random.Random(f"{seed}-words"))
+    state.mode_counts = {(mode, char): {'correct': correct, 'total': total}
+                         for mode, char, correct, total in snapshot['mode_counts']}
+    if snapshot['adaptive'] != "off":
+        state.selector = AdaptiveModeSelector(snapshot['adaptive'], np.random.default_rng(seed))
+        state.selector.load(state.mode_counts)
+    state.new_question(snapshot['mode'])  # 对应界面初始化时的第一题
+
+    start = time.perf_counter()
+    for event, _, text in events:
+        try:
+            if event == EVENT_MODE:
+                state.new_question(text)
+            elif event == EVENT_NEXT:
+                state.new_question()
+            elif event == EVENT_ANSWER:
+                state.check_answer(text)
+            elif event == EVENT_SWAP:
+                state.swap_mode()
+            elif event == EVENT_RANDOM:
+                state.random_mode()
+            elif event == EVENT_SHUFFLE:
+                state.set_triple_mode(not state.is_triple_mode)
+            elif event == EVENT_INTENSIVE:
+                state.prefetcher.next_board(weakest_chars(state.correct_counts, 10))
+            elif event == EVENT_WORD_DRILL:
+                if state.word_index is None:
+                    state.word_index = WordIndex.open(WORD_SOURCE_FILE, WORD_INDEX_FILE)
+                    if state.word_index is None:
+                        print("录制中使用了单词练习，重放需要同一份单词表 words.txt")
+                        return
+                state.set_word_drill(not state.word_drill)
+            elif event == EVENT_WORD_NEXT:
+                if state.word_drill:
+                    state.new_word_question()
+            elif event == EVENT_WORD_ANSWER:
+                state.check_word_answer(text)
+        except (ValueError, LookupError):
+            pass  # 与界面一致：未知模式不出题，没有题目时作答无效
+    elapsed = time.perf_counter() - start
+    print_replay_report(events, elapsed, state.correct_counts, state.streak, state.high_score)
+
+
+# ---------------- 列式导出 ----------------
+
+COLUMNAR_MAGIC = b"KANACOL1"
+COLUMNAR_ALIGNMENT = 64  # 每列数据按 64 字节对齐，与 Arrow 一致
+COLUMNAR_FOOTER = struct.Struct("<Q8s")  # 元数据长度, 魔数
+COLUMNAR_CHUNK = 100000  # 导入时每批写入的行数
+# 导出的表与列，dtype 为 None 的文本列按字典编码
+COLUMNAR_TABLES = {
+    'attempts': [('ts', '<f8'), ('char', None), ('mode', None), ('correct', 'u1'), ('triple', 'u1')],
+    'proficiency_stats': [('char', None), ('correct', '<i8'), ('total', '<i8')],
+    'mode_stats': [('mode', None), ('char', None), ('correct', '<i8'), ('total', '<i8')],
+    'daily_rollup': [('day', None), ('char', None), ('correct', '<i8'), ('total', '<i8')],
+    'weekly_rollup': [('week', None), ('char', None), ('correct', '<i8'), ('total', '<i8')],
+    'streak_stats': [('id', '<i8'), ('streak', '<i8'), ('high_score', '<i8')],
+    'streak_records': [('profile', None), ('mode', None), ('triple', 'u1'), ('length', '<i8'),
+                       ('started', '<f8'), ('ended', '<f8')],
+    'leaderboard': [('mode', None), ('period', None), ('period_key', None), ('profile', None),
+                    ('length', '<i8'), ('triple', 'u1'), ('achieved', '<f8')],
+}
+
+
+def dictionary_code_dtype(size):  # 字典编码使用能容纳全部取值的最小整数类型
+    return 'u1' if size <= 1 << 8 else '<u2' if size <= 1 << 16 else '<u4'
+
+
+def check_columnar_metadata(metadata, data_end, path):  # 元数据中的表、列与类型必须与 COLUMNAR_TABLES 一致
+    """
+    表名和列名之后会拼进 SQL，只接受 COLUMNAR_TABLES 中定义的表和列；
+    每列数据必须完整落在 [0, data_end) 内，任何不符都抛出 ValueError。
+    """
+    if not isinstance(metadata, dict):
+        raise ValueError(f"列式文件元数据格式错误: {path}")
+    for table, meta in metadata.items():
+        if table not in COLUMNAR_TABLES:
+            raise ValueError(f"列式文件中有未知的表: {table}")
+        if not isinstance(meta, dict):
+            raise ValueError(f"列式文件中 {table} 的元数据格式错误")
+        rows = meta.get('rows')
+        if not isinstance(rows, int) or isinstance(rows, bool) or rows < 0:
+            raise ValueError(f"列式文件中 {table} 的行数错误")
+        columns = meta.get('columns')
+        if not isinstance(columns, list) or not all(isinstance(column, dict) for column in columns) \
+                or [column.get('name') for column in columns] != [name for name, _ in COLUMNAR_TABLES[table]]:
+            raise ValueError(f"列式文件中 {table} 的列与数据库不一致")
+        for column, (name, dtype) in zip(columns, COLUMNAR_TABLES[table]):
+            dictionary = column.get('dictionary')
+            if dtype is None:
+                if column.get('dtype') not in ('u1', '<u2', '<u4') or not isinstance(dictionary, list) \
+                        or not all(value is None or isinstance(value, (str, int, float)) for value in dictionary):
+                    raise ValueError(f"列式文件中 {table}.{name} 的字典编码错误")
+            elif column.get('dtype') != dtype or dictionary is not None:
+                raise ValueError(f"列式文件中 {table}.{name} 的类型错误")
+            offset = column.get('offset')
+            if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0 \
+                    or offset + rows * np.dtype(column['dtype']).itemsize > data_end:
+                raise ValueError(f"列式文件中 {table}.{name} 的数据位置超出文件范围")
+
+
+def export_columnar(conn, path):  # 把答题记录与各汇总表导出为列式文件，返回各表行数
+    """
+    文件布局：魔数 | 按 64 字节对齐的各列数据 | JSON 元数据 | 元数据长度与魔数。
+    文本列按字典编码：先取出去重后的取值，再在 SQLite 中连接临时字典表得到整数编码，
+    整张表用 np.fromiter 一次读入结构化数组，不在 Python 中逐行处理字符串。
+    """
+    metadata = {}
+    with open(path, 'wb') as f:
+        f.write(COLUMNAR_MAGIC)
+        for table, columns in COLUMNAR_TABLES.items():
+            dictionaries = {}
+            select = []
+            joins = []
+            for name, dtype in columns:
+                if dtype is None:
+                    values = [row[0] for row in conn.execute(f'SELECT DISTINCT {name} FROM {table} ORDER BY {name}')]
+                    dict_table = f'temp.columnar_{name}'
+                    conn.execute(f'DROP TABLE IF EXISTS {dict_table}')
+                    conn.execute(f'CREATE TABLE {dict_table} (code INTEGER PRIMARY KEY, value TEXT UNIQUE)')
+                    conn.executemany(f'INSERT INTO {dict_table} (code, value) VALUES (?, ?)', enumerate(values))
+                    dictionaries[name] = values
+                    select.append(f'd_{name}.code')
+                    joins.append(f'JOIN {dict_table} d_{name} ON d_{name}.value IS t.{name}')
+                else:
+                    select.append(f't.{name}')
+            dtypes = [(name, dtype or dictionary_code_dtype(len(dictionaries[name]))) for name, dtype in columns]
+            count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            cursor = conn.execute(f'SELECT {", ".join(select)} FROM {table} t {" ".join(joins)} ORDER BY t.rowid')
+            records = np.fromiter(cursor, dtype=dtypes, count=count)
+            for name in dictionaries:
+                conn.execute(f'DROP TABLE temp.columnar_{name}')
+
+            column_meta = []
+            for name, dtype in dtypes:
+                f.write(b"\0" * (-f.tell() % COLUMNAR_ALIGNMENT))
+                column_meta.append({'name': name, 'dtype': dtype, 'offset': f.tell(),
+                                    'dictionary': dictionaries.get(name)})
+                f.write(np.ascontiguousarray(records[name]).tobytes())
+            metadata[table] = {'rows': count, 'columns': column_meta}
+
+        footer = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+        f.write(footer)
+        f.write(COLUMNAR_FOOTER.pack(len(footer), COLUMNAR_MAGIC))
+    return {table: meta['rows'] for table, meta in metadata.items()}
+
+
+class ColumnarFile:  # 内存映射的列式文件
+    """每列都是指向映射内存的 NumPy 视图，读取时不复制数据；字典编码的列保留整数编码"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.columns = {}  # (表, 列) -> 数组
+        self.dictionaries = {}  # (表, 列) -> 取值列表
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空文件无法映射
+            self.file.close()
+            raise ValueError(f"不是列式导出文件: {path}")
+        try:
+            self.load(path)
+        except ValueError:
+            self.close()
+            raise
 
-        selected_button = [None, None]
-        original_bg = intensive_window.cget("background")
-
-        # 定义微软雅黑字体
-        msyh_font = tkfont.Font(family="微软雅黑", size=12)
-
-        # 创建一个新的样式
-        style = ttk.Style()
-        style.configure("CustomMSYH.TButton", font=msyh_font)
-
-        def on_button_click(btn, char):
-            nonlocal original_bg, selected_button
-            if selected_button[0] is None:
-                selected_button[0] = (btn, char)
-                if btn.winfo_exists():
-                    btn.config(bootstyle="info")
-            elif selected_button[1] is None:
-                # 禁止自己连自己
-                if btn == selected_button[0][0]:
-                    return
-                selected_button[1] = (btn, char)
-                if btn.winfo_exists():
-                    btn.config(bootstyle="info")
-                match_success = False
-                for _, chars in SOUND_MAP.items():
-                    if selected_button[0][1] in chars and selected_button[1][1] in chars:
-                        if selected_button[0][0].winfo_exists():
-                            selected_button[0][0].destroy()
-                        if selected_button[1][0].winfo_exists():
-                            selected_button[1][0].destroy()
-                        # 匹配成功，窗口变绿一秒
-                        intensive_window.configure(background="green")
-                        intensive_window.after(1000, lambda: intensive_window.configure(background=original_bg))
-                        match_success = True
-                        break
-                if not match_success:
-                    # 匹配失败，窗口变红一秒
-                    intensive_window.configure(background="red")
-                    intensive_window.after(1000, lambda: intensive_window.configure(background=original_bg))
-                    if selected_button[0][0].winfo_exists():
-                        selected_button[0][0].config(bootstyle="Custom.TButton")
-                    if selected_button[1][0].winfo_exists():
-                        selected_button[1][0].config(bootstyle="Custom.TButton")
-                selected_button = [None, None]
+    def load(self, path):  # 校验文件头尾与元数据，为每列建立视图；出错时抛出 ValueError
+        if len(self.data) < len(COLUMNAR_MAGIC) + COLUMNAR_FOOTER.size:
+            raise ValueError(f"不是列式导出文件: {path}")
+        footer_length, magic = COLUMNAR_FOOTER.unpack_from(self.data, len(self.data) - COLUMNAR_FOOTER.size)
+        footer_start = len(self.data) - COLUMNAR_FOOTER.size - footer_length
+        if self.data[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC or magic != COLUMNAR_MAGIC \
+                or footer_start < len(COLUMNAR_MAGIC):
+            raise ValueError(f"不是列式导出文件: {path}")
+        # JSON 或 UTF-8 解码失败时抛出的也是 ValueError
+        self.metadata = json.loads(self.data[footer_start:footer_start + footer_length].decode('utf-8'))
+        check_columnar_metadata(self.metadata, footer_start, path)
+        for table, meta in self.metadata.items():
+            for column in meta['columns']:
+                key = (table, column['name'])
+                self.columns[key] = np.frombuffer(self.data, dtype=column['dtype'], count=meta['rows'],
+                                                  offset=column['offset'])
+                if column['dictionary'] is not None:
+                    self.dictionaries[key] = column['dictionary']
+                    # 字典编码必须都能在字典中查到
+                    if meta['rows'] and int(self.columns[key].max()) >= len(column['dictionary']):
+                        raise ValueError(f"列式文件中 {table}.{column['name']} 的字典编码超出字典范围")
+
+    def rows(self, table):
+        return self.metadata[table]['rows'] if table in self.metadata else 0
+
+    def column(self, table, name):  # 列数据，字典编码的列为整数编码
+        return self.columns[(table, name)]
+
+    def decode(self, table, name, start=0, stop=None):  # 把一段字典编码的列还原为字符串列表
+        codes = self.columns[(table, name)][start:stop]
+        return np.array(self.dictionaries[(table, name)], dtype=object)[codes].tolist()
+
+    def close(self):
+        # 先释放 NumPy 视图，否则 mmap 无法关闭
+        self.columns = {}
+        self.data.close()
+        self.file.close()
+
+
+def import_columnar(conn, path):  # 用列式文件替换数据库中的答题记录与各汇总表，返回各表行数
+    columnar = ColumnarFile(path)
+    try:
+        counts = {}
+        with conn:
+            for table, meta in columnar.metadata.items():
+                # 表名与列名取自 COLUMNAR_TABLES，不直接使用文件中的字符串
+                names = [name for name, _ in COLUMNAR_TABLES[table]]
+                conn.execute(f'DELETE FROM {table}')
+                sql = f'INSERT INTO {table} ({", ".join(names)}) VALUES ({", ".join("?" * len(names))})'
+                for start in range(0, meta['rows'], COLUMNAR_CHUNK):
+                    stop = start + COLUMNAR_CHUNK
+                    values = [columnar.decode(table, name, start, stop) if (table, name) in columnar.dictionaries
+                              else columnar.column(table, name)[start:stop].tolist() for name in names]
+                    conn.executemany(sql, zip(*values))
+                counts[table] = meta['rows']
+        return counts
+    finally:
+        columnar.close()
+
+
+def run_columnar(db_path, export_file=None, import_file=None):  # 命令行导出/导入并输出用时与文件大小
+    conn = sqlite3.connect(db_path)
+    create_practice_tables(conn)
+    start = time.perf_counter()
+    if export_file:
+        counts = export_columnar(conn, export_file)
+        path = export_file
+    else:
+        counts = import_columnar(conn, import_file)
+        path = import_file
+    elapsed = time.perf_counter() - start
+    conn.close()
+    print(f"{'导出' if export_file else '导入'}用时: {elapsed:.2f}s  文件大小: {os.path.getsize(path) / 1024 / 1024:.2f} MiB")
+    print("  ".join(f"{table}: {count}" for table, count in counts.items()))
+
+
+# ---------------- 多人压测 ----------------
+
+class HttpQuizClient:  # 压测用的 keep-alive HTTP 客户端
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          f"Content-Length: {len(data)}\r\n\r\n".encode('utf-8') + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        payload = json.loads(await self.reader.readexactly(length))
+        if status != 200:
+            raise QuizError(status, payload.get('error', ''))
+        return payload
+
+    async def call(self, learner_id, op, params):
+        from urllib.parse import quote
+        if op == 'answer':
+            return await self.request('POST', f"/learners/{quote(learner_id)}/answer", params)
+        query = '&'.join(f"{key}={quote(str(value))}" for key, value in params.items())
+        return await self.request('GET', f"/learners/{quote(learner_id)}/{op}?{query}")
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def simulate_learner(call, learner_id, options, rng, latencies):  # 模拟一个学习者
+    """
+    按设定的正确率、思考时间与模式组合答题。
+    call(op, params) 是一次请求，在进程内直接调用服务器，或通过 HTTP 访问本地服务器。
+    """
+    accuracy = rng.uniform(options.accuracy_min, options.accuracy_max)
+    mode = rng.choice(MODES)
+    is_triple_mode = rng.random() < options.triple_ratio
+    errors = 0
+    for _ in range(options.answers):
+        try:
+            start = time.perf_counter()
+            # 按 random_ratio 点 🎲，由服务器的自适应随机模式选模式，之后的题目沿用该模式
+            if rng.random() < options.random_ratio:
+                question = await call('random', {'triple': int(is_triple_mode)})
+            else:
+                question = await call('question', {'mode': mode, 'triple': int(is_triple_mode)})
+            latencies.append(time.perf_counter() - start)
+            mode = question['mode']
+
+            if options.think_time > 0:
+                await asyncio.sleep(rng.expovariate(1000 / options.think_time))
 
-        for i in range(rows):
-            game_frame.rowconfigure(i, weight=1)
-            for j in range(cols):
-                game_frame.columnconfigure(j, weight=1)
-                char = board[i][j]
-                btn = ttk.Button(
-                    game_frame,
-                    text=char,
-                    style="CustomMSYH.TButton"
-                )
-                btn.config(command=lambda b=btn, c=char: on_button_click(b, c))
-                btn.grid(row=i, column=j, padx=5, pady=5, sticky="nsew")
+            left, right = mode.split("-")
+            answer = SCRIPTS[right][SCRIPTS[left].index(question['prompt'])]
+            if rng.random() >= accuracy:
+                answer = rng.choice([char for char in SCRIPTS[right] if char != answer])
+            start = time.perf_counter()
+            await call('answer', {'answer': answer})
+            latencies.append(time.perf_counter() - start)
+        except (QuizError, ConnectionError, asyncio.IncompleteReadError):
+            errors += 1
+    return errors
+
+
+async def run_inprocess_load(options, db_path):  # 进程内压测：直接调用服务器逻辑与存储层
+    server = QuizServer(db_path, flush_interval=options.flush_interval, adaptive=options.adaptive)
+    server.writer.start()
+    latencies = []
+    rng = random.Random(options.seed)
+    tasks = []
+    for i in range(options.learners):
+        learner_id = f"learner-{i}"
+        call = (lambda op, params, learner_id=learner_id: server.dispatch(learner_id, op, params))
+        tasks.append(simulate_learner(call, learner_id, options, random.Random(rng.random()), latencies))
+    start = time.perf_counter()
+    errors = sum(await asyncio.gather(*tasks))
+    elapsed = time.perf_counter() - start
+    await server.writer.stop()
+    stats = server.storage_stats()
+    server.writer.close()
+    server.pool.close()
+    return latencies, errors, elapsed, stats
+
+
+async def run_http_learners(options, learner_ids, seed):  # 一个压测进程内的 HTTP 学习者
+    host, _, port = options.url.rpartition(':')
+    rng = random.Random(seed)
+    latencies = []
+    clients = []
+    tasks = []
+    for learner_id in learner_ids:
+        client = HttpQuizClient(host, int(port))
+        clients.append(client)
+        call = (lambda op, params, client=client, learner_id=learner_id: client.call(learner_id, op, params))
+        tasks.append(simulate_learner(call, learner_id, options, random.Random(rng.random()), latencies))
+    errors = sum(await asyncio.gather(*tasks))
+    for client in clients:
+        await client.close()
+    return latencies, errors
+
+
+def _load_worker(args):  # 压测子进程入口
+    options, learner_ids, seed = args
+    return asyncio.run(run_http_learners(options, learner_ids, seed))
+
+
+def run_load_test(options):  # 运行压测并输出报告
+    if options.url:
+        host, _, port = options.url.rpartition(':')
+        stats_client = HttpQuizClient(host, int(port))
+
+        async def fetch_stats():
+            try:
+                return await stats_client.request('GET', '/stats?flush=1')
+            finally:
+                await stats_client.close()
+
+        before = asyncio.run(fetch_stats())
+        learner_ids = [f"{options.prefix}-{i}" for i in range(options.learners)]
+        processes = max(1, options.processes)
+        jobs = [(options, learner_ids[i::processes], None if options.seed is None else options.seed * 1000 + i)
+                for i in range(processes)]
+        start = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_load_worker, jobs)
+        elapsed = time.perf_counter() - start
+        latencies = [latency for result in results for latency in result[0]]
+        errors = sum(result[1] for result in results)
+        stats_client = HttpQuizClient(host, int(port))
+        after = asyncio.run(fetch_stats())
+        stats = {key: after[key] - before[key] for key in ('answers_recorded', 'rows_written',
+                                                             'transactions', 'db_bytes')}
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = options.db or os.path.join(tmp_dir, "loadtest.db")
+            latencies, errors, elapsed, stats = asyncio.run(run_inprocess_load(options, db_path))
+
+    print_load_report(latencies, errors, elapsed, stats)
+
+
+def print_load_report(latencies, errors, elapsed, stats):  # 输出压测报告
+    requests = len(latencies)
+    answers = max(stats['answers_recorded'], 1)
+    print(f"请求数: {requests}  出错: {errors}  用时: {elapsed:.2f}s")
+    print(f"吞吐量: {requests / elapsed:.0f} 请求/s，{stats['answers_recorded'] / elapsed:.0f} 答题/s")
+    if requests:
+        p50, p90, p99, p999 = np.percentile(np.array(latencies) * 1000, [50, 90, 99, 99.9])
+        print(f"延迟(ms): p50={p50:.2f} p90={p90:.2f} p99={p99:.2f} p99.9={p999:.2f} "
+              f"max={max(latencies) * 1000:.2f}")
+    print(f"写放大: {stats['rows_written'] / answers:.3f} 行/答题，"
+          f"{stats['db_bytes'] / answers:.1f} 字节/答题，"
+          f"{stats['transactions']} 个事务")
 
 
 if __name__ == "__main__":
-    root = ttk.Window()
-    app = KanaPracticeApp(root)
-    root.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="日语五十音练习")
+    parser.add_argument("--db", default="kana_practice.db", help="SQLite 数据库路径")
+    parser.add_argument("--adaptive", choices=["mode", "kana", "off"], default="mode",
+                        help="🎲 随机模式的选择方式：按模式或按(模式, 假名)自适应，off 为均匀随机")
+    parser.add_argument("--glyph-atlas", action="store_true", help="用预先栅格化的假名图集绘制键盘、连连看与熟练度地图")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，练习与压测可复现")
+    parser.add_argument("--prefetch", type=int, default=8, help="空闲时预取的题目数")
+    parser.add_argument("--derange", action="store_true", help="乱序键盘中没有任何按键留在原位")
+    parser.add_argument("--build-stroke-templates", metavar="DIR",
+                        help="从 KanjiVG 的 kanji 目录重新生成内置假名笔迹模板")
+    parser.add_argument("--profile", default="default", help="档案名，连胜记录与排行榜按档案区分")
+    parser.add_argument("--leaderboard", action="store_true", help="输出 --db 中各模式、各周期的连胜排行榜")
+    parser.add_argument("--memory-check", type=int, metavar="N",
+                        help="用内存数据库反复打开、关闭加强训练窗口 N 次并输出内存占用")
+
+    session = parser.add_argument_group("录制与重放")
+    session.add_argument("--record", metavar="FILE", help="把本次练习的种子与操作录制到文件")
+    session.add_argument("--replay", metavar="FILE", help="按最快速度重放录制文件")
+    session.add_argument("--headless", action="store_true", help="重放时不打开界面，只执行练习逻辑")
+
+    columnar = parser.add_argument_group("列式导出")
+    columnar.add_argument("--export", metavar="FILE", help="把答题记录与汇总表导出为可内存映射的列式文件")
+    columnar.add_argument("--import", dest="import_file", metavar="FILE",
+                          help="用列式文件替换 --db 中的答题记录与汇总表")
+
+    parser.add_argument("--server", action="store_true", help="以多人练习服务器方式运行")
+    parser.add_argument("--host", default="127.0.0.1", help="服务器监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="服务器监听端口")
+
+    loadtest = parser.add_argument_group("压测")
+    loadtest.add_argument("--loadtest", action="store_true", help="运行多人压测")
+    loadtest.add_argument("--url", help="压测本地服务器 host:port，不指定时在进程内压测")
+    loadtest.add_argument("--processes", type=int, default=1, help="访问服务器的压测进程数")
+    loadtest.add_argument("--learners", type=int, default=1000, help="模拟学习者人数")
+    loadtest.add_argument("--answers", type=int, default=50, help="每人答题数")
+    loadtest.add_argument("--accuracy-min", type=float, default=0.5, help="学习者正确率下限")
+    loadtest.add_argument("--accuracy-max", type=float, default=0.95, help="学习者正确率上限")
+    loadtest.add_argument("--think-time", type=float, default=0, help="平均思考时间(ms)，按指数分布抽样")
+    loadtest.add_argument("--random-ratio", type=float, default=0.3,
+                          help="每题点 🎲 随机模式的概率，按 --adaptive 选择模式（进程内压测；服务器压测由服务器的 --adaptive 决定）")
+    loadtest.add_argument("--triple-ratio", type=float, default=0.2, help="使用三倍模式的学习者比例")
+    loadtest.add_argument("--flush-interval", type=float, default=0.2, help="进程内压测的批量写入间隔(s)")
+    loadtest.add_argument("--prefix", default="loadtest", help="服务器压测时的学习者 ID 前缀")
+    args = parser.parse_args()
+
+    if args.loadtest:
+        if not args.url and args.db == parser.get_default("db"):
+            args.db = None  # 进程内压测默认使用临时数据库
+        run_load_test(args)
+    elif args.build_stroke_templates:
+        output_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), STROKE_TEMPLATE_FILE)
+        print(f"已生成 {build_stroke_templates(args.build_stroke_templates, output_file)} 个假名的笔迹模板")
+    elif args.leaderboard:
+        print_leaderboard(args.db)
+    elif args.export or args.import_file:
+        run_columnar(args.db, args.export, args.import_file)
+    elif args.server:
+        run_server(args.host, args.port, args.db, args.adaptive)
+    elif args.replay and args.headless:
+        replay_session_headless(args.replay)
+    elif args.memory_check:
+        root = ttk.Window()
+        app = KanaPracticeApp(root, ":memory:", args.adaptive, args.glyph_atlas, seed=args.seed, persist=False)
+        # 构造足够生成词云与连连看的统计数据
+        for i, char in enumerate(HIRAGANA):
+            app.correct_counts[char] = {'correct': i % 10, 'total': 10}
+        app.check_intensive_memory(args.memory_check)
+        root.mainloop()
+    elif args.replay:
+        # 界面重放使用内存数据库，不影响已保存的统计
+        seed, snapshot, events = read_session(args.replay)
+        root = ttk.Window()
+        app = KanaPracticeApp(root, ":memory:", snapshot['adaptive'], args.glyph_atlas, seed=seed, persist=False,
+                              prefetch=args.prefetch, derange=snapshot.get('derange', False))
+        app.apply_snapshot(snapshot)
+        app.replay(events)
+        root.mainloop()
+    else:
+        root = ttk.Window()
+        app = KanaPracticeApp(root, args.db, args.adaptive, args.glyph_atlas, args.seed, args.record,
+                              prefetch=args.prefetch, derange=args.derange, profile=args.profile)
+        root.mainloop()